@@ -0,0 +1,447 @@
+import os
+import re
+import json
+import math
+import zlib
+import heapq
+import hashlib
+import mmap
+import multiprocessing
+from collections import Counter
+import numpy as np
+from tqdm import tqdm
+
+from ingest import bounded_imap, split_byte_ranges
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pq = None
+
+# Columns aggregation reads, in the order the book iterators yield them
+AGGREGATION_COLUMNS = ["publisher", "title", "blurb", "average_rating", "ratings_count", "genre_ids", "shelf_ids"]
+
+TOP_COMP_TITLES = 5
+TOP_BLURBS = 15
+# Most-rated books per publisher considered for the books file of book-level retrieval (those without a blurb are
+# skipped). Only kept when the caller asks for them (aggregate_publishers' book_index_books), as it widens every heap
+BOOK_INDEX_BOOKS = 100
+SHARD_BYTES = 64 * 1024 * 1024  # JSONL shard size for the parallel path (Parquet shards are row groups)
+
+# Near-duplicate blurbs (reprints / editions of one work) are dropped from a publisher's top blurbs.
+# Blurbs are compared by MinHash signatures of their word shingles; LSH bands find candidate pairs and a pair
+# whose estimated Jaccard similarity reaches the threshold counts as the same work. None disables the filter.
+BLURB_DEDUP_THRESHOLD = 0.5
+SHINGLE_WORDS = 3
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 bands of 4 rows: pairs around Jaccard 0.5 and up become candidates
+
+# Sequence numbers are (shard << 40) + position in shard, so sorting by them reproduces file order
+_SHARD_SHIFT = 40
+
+
+# ==========================================
+# READING THE MERGED DATASET
+# ==========================================
+def _book_from_json(line):
+    book = json.loads(line)
+    return (
+        book.get('publisher', ''), book.get('title', ''), book.get('blurb', ''),
+        book.get('average_rating', 0.0), book.get('ratings_count', 0), book.get('genres', []),
+        [s['name'] for s in book.get('popular_shelves', [])]
+    )
+
+
+def _iter_jsonl_range(path, start, end):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        while mm.tell() < end:
+            line = mm.readline()
+            if line.strip():
+                yield _book_from_json(line)
+
+
+def _iter_parquet_row_groups(path, row_groups):
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(columns=AGGREGATION_COLUMNS, row_groups=row_groups):
+        cols = batch.to_pydict()
+        yield from zip(*(cols[name] for name in AGGREGATION_COLUMNS))
+
+
+def terms_path(merged_path):
+    """Where the Parquet export writes the names behind its integer genre/shelf ids."""
+    return os.path.splitext(merged_path)[0] + ".terms.json"
+
+
+def load_terms(fmt, merged_path):
+    """Id -> name list for Parquet input; None for JSONL, whose genres/shelves are already names."""
+    if fmt != "parquet": return None
+    with open(terms_path(merged_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _require_pyarrow(fmt):
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("pyarrow is not installed. Install it or use fmt='jsonl'.")
+
+
+# ==========================================
+# HEAVY-HITTER SKETCH
+# ==========================================
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter sketch: tracks at most `capacity` keys, so genre/shelf memory per publisher is bounded.
+    Counts are overestimates by at most the smallest tracked count. Mirrors the bits of Counter we use
+    (`update(iterable)`, `most_common(n)`) and supports merging partial sketches.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = []  # (count, key); may hold stale counts, refreshed lazily on eviction
+
+    def update(self, keys):
+        counts = self.counts
+        for key in keys:
+            if key in counts:
+                counts[key] += 1
+            elif len(counts) < self.capacity:
+                counts[key] = 1
+                self.errors[key] = 0
+                heapq.heappush(self._heap, (1, key))
+            else:
+                floor = self._pop_min()
+                counts[key] = floor + 1
+                self.errors[key] = floor
+                heapq.heappush(self._heap, (floor + 1, key))
+
+    def _pop_min(self):
+        """Evicts the key with the smallest count and returns that count."""
+        heap = self._heap
+        while True:
+            count, key = heap[0]
+            current = self.counts[key]
+            if current == count:
+                heapq.heappop(heap)
+                del self.counts[key]
+                del self.errors[key]
+                return count
+            heapq.heapreplace(heap, (current, key))
+
+    def _floor(self):
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other):
+        """Folds another sketch in; keys missing from a full sketch are credited with its smallest count."""
+        mine, theirs = self._floor(), other._floor()
+        counts, errors = {}, {}
+        for key in list(self.counts) + [k for k in other.counts if k not in self.counts]:
+            counts[key] = self.counts.get(key, mine) + other.counts.get(key, theirs)
+            errors[key] = self.errors.get(key, mine) + other.errors.get(key, theirs)
+
+        kept = sorted(counts, key=lambda k: (-counts[k], k))[:self.capacity]
+        self.counts = {k: counts[k] for k in kept}
+        self.errors = {k: errors[k] for k in kept}
+        self._heap = [(c, k) for k, c in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def most_common(self, n=None):
+        items = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        return items if n is None else items[:n]
+
+
+def _new_term_counter(heavy_hitters):
+    return SpaceSaving(heavy_hitters) if heavy_hitters else Counter()
+
+
+def _merge_term_counter(into, other):
+    if isinstance(into, SpaceSaving):
+        into.merge(other)
+    else:
+        into.update(other)
+
+
+# ==========================================
+# MERGEABLE PARTIAL AGGREGATES
+# ==========================================
+def _add_exact(partials, x):
+    """Adds x to a list of non-overlapping float partials (Shewchuk); math.fsum(partials) is the exact sum."""
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+def accumulate_book(publishers, book, seq, heavy_hitters=None, book_index_books=0):
+    """
+    Folds one merged book into the per-publisher partial aggregates.
+    heavy_hitters: None for exact genre/shelf Counters, or a SpaceSaving capacity to bound them.
+    book_index_books: keep this many top books per publisher (instead of TOP_BLURBS) when it is more.
+    """
+    pub, title, blurb, average_rating, cnt, genres, shelves = book
+    pub = pub.strip()
+    if not pub or pub.lower() == 'unknown publisher': return
+
+    if pub not in publishers:
+        publishers[pub] = {"vol": 0, "total_ratings": 0, "rating_sum": [],
+                           "genres": _new_term_counter(heavy_hitters),
+                           "shelves": _new_term_counter(heavy_hitters), "books": []}
+
+    p = publishers[pub]
+    p["vol"] += 1
+    p["genres"].update(genres)
+    p["shelves"].update(shelves)
+
+    p["total_ratings"] += cnt
+    _add_exact(p["rating_sum"], average_rating * cnt)
+    _push_top_book(p["books"], (cnt, -seq, title, blurb), book_index_books)
+
+
+def _push_top_book(heap, book, book_index_books=0):
+    """
+    Keeps `heap` as a min-heap of the best max(TOP_BLURBS, book_index_books) books, so memory per publisher stays
+    O(K) instead of O(books).
+    Books are (ratings_count, -seq, title, blurb): more ratings wins, ties go to the earlier book in the file.
+    """
+    if len(heap) < max(TOP_BLURBS, book_index_books):
+        heapq.heappush(heap, book)
+    elif book[:2] > heap[0][:2]:
+        heapq.heapreplace(heap, book)
+
+
+def _top_books(books, n=None):
+    """The best `n` (default TOP_BLURBS): highest ratings_count first; ties keep file order (the seq number)."""
+    return sorted(books, key=lambda b: (b[0], b[1]), reverse=True)[:TOP_BLURBS if n is None else n]
+
+
+def merge_partials(publishers, partial, book_index_books=0):
+    """Merges a later shard's partial aggregates into `publishers` (new publishers keep first-seen order)."""
+    for pub, q in partial.items():
+        p = publishers.get(pub)
+        if p is None:
+            publishers[pub] = q
+            continue
+        p["vol"] += q["vol"]
+        _merge_term_counter(p["genres"], q["genres"])
+        _merge_term_counter(p["shelves"], q["shelves"])
+        p["total_ratings"] += q["total_ratings"]
+        for x in q["rating_sum"]:
+            _add_exact(p["rating_sum"], x)
+        for book in q["books"]:
+            _push_top_book(p["books"], book, book_index_books)
+
+
+def aggregate_shard(task):
+    """Pool worker: aggregates one shard. Returns (progress units, partial)."""
+    fmt, path, shard_idx, spec, heavy_hitters, book_index_books = task
+    if fmt == "parquet":
+        books = _iter_parquet_row_groups(path, [spec])
+        units = pq.ParquetFile(path).metadata.row_group(spec).num_rows
+    else:
+        books = _iter_jsonl_range(path, *spec)
+        units = spec[1] - spec[0]
+
+    publishers = {}
+    base = shard_idx << _SHARD_SHIFT
+    for i, book in enumerate(books):
+        accumulate_book(publishers, book, base + i, heavy_hitters, book_index_books)
+    return units, publishers
+
+
+def aggregate_publishers(fmt, path, workers=1, heavy_hitters=None, book_index_books=0):
+    """
+    Groups the merged dataset by publisher. With workers > 1, shards are aggregated in a pool and merged in order.
+    heavy_hitters: optional SpaceSaving capacity for approximate, memory-bounded genre/shelf counting.
+    book_index_books: top books to keep per publisher for `build_book_records` (0: only the TOP_BLURBS profiles use).
+    """
+    _require_pyarrow(fmt)
+    if fmt == "parquet":
+        n_row_groups = pq.ParquetFile(path).metadata.num_row_groups
+        specs = list(range(n_row_groups))
+        pbar = tqdm(total=pq.ParquetFile(path).metadata.num_rows, desc="Aggregating Profiles")
+    else:
+        specs = split_byte_ranges(path, SHARD_BYTES) if workers > 1 else [(0, os.path.getsize(path))]
+        pbar = tqdm(total=os.path.getsize(path), unit='B', unit_scale=True, desc="Aggregating Profiles")
+    tasks = [(fmt, path, shard_idx, spec, heavy_hitters, book_index_books) for shard_idx, spec in enumerate(specs)]
+
+    publishers = {}
+    with pbar:
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                for units, partial in bounded_imap(pool, aggregate_shard, tasks, workers * 2):
+                    merge_partials(publishers, partial, book_index_books)
+                    pbar.update(units)
+        else:
+            for task in tasks:
+                units, partial = aggregate_shard(task)
+                merge_partials(publishers, partial, book_index_books)
+                pbar.update(units)
+    return publishers
+
+
+# ==========================================
+# NEAR-DUPLICATE BLURBS
+# ==========================================
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240101)  # Fixed, so profiles are reproducible across runs and processes
+_MINHASH_A = _rng.integers(1, _MERSENNE_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_MINHASH_B = _rng.integers(0, _MERSENNE_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE_BASE = 1_000_003
+
+
+def minhash_signature(text):
+    """MinHash signature of the text's lower-cased word shingles (crc32-based, so stable across processes)."""
+    words = _WORD_RE.findall(text.lower())
+    word_hashes = np.fromiter((zlib.crc32(w.encode('utf-8')) for w in words), dtype=np.uint64, count=len(words))
+    n = max(len(words) - SHINGLE_WORDS + 1, 1)
+    shingles = np.zeros(n, dtype=np.uint64)
+    for i in range(min(SHINGLE_WORDS, len(words))):  # Polynomial hash of each run of SHINGLE_WORDS words
+        shingles = shingles * np.uint64(_SHINGLE_BASE) + word_hashes[i: i + n]
+    shingles = np.unique(shingles)
+    # (a * x + b) mod p, with the product wrapping around in uint64 (as in datasketch's MinHash)
+    return (((np.outer(shingles, _MINHASH_A) + _MINHASH_B) % _MERSENNE_PRIME) & 0xFFFFFFFF).min(axis=0)
+
+
+def distinct_blurbs(blurbs, threshold=BLURB_DEDUP_THRESHOLD):
+    """
+    Drops blurbs that are near-duplicates of a blurb earlier in the list (the better-ranked edition is kept).
+    Returns (kept blurbs, number dropped).
+    """
+    if threshold is None or len(blurbs) < 2: return list(blurbs), 0
+
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    buckets = {}  # (band, band values) -> positions in `signatures` of kept blurbs
+    kept, signatures = [], []
+    for blurb in blurbs:
+        signature = minhash_signature(blurb)
+        bands = [(band, signature[band * rows: (band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+        candidates = {j for key in bands for j in buckets.get(key, ())}
+        if any(np.mean(signatures[j] == signature) >= threshold for j in candidates):
+            continue
+        for key in bands:
+            buckets.setdefault(key, []).append(len(signatures))
+        kept.append(blurb)
+        signatures.append(signature)
+    return kept, len(blurbs) - len(kept)
+
+
+class BlurbDedupReport:
+    """Totals for a build: blurbs dropped and embedding tokens of dense_text with and without the filter."""
+
+    def __init__(self, budget):
+        self.budget = budget  # embedding_batches.TokenBudget, so counts match what gets embedded
+        self.profiles = 0
+        self.blurbs_dropped = 0
+        self.tokens = 0
+        self.baseline_tokens = 0
+
+    def add(self, dense_text, baseline_text, n_dropped):
+        tokens = self.budget.truncate(dense_text)[1]
+        self.profiles += 1
+        self.blurbs_dropped += n_dropped
+        self.tokens += tokens
+        self.baseline_tokens += self.budget.truncate(baseline_text)[1] if n_dropped else tokens
+
+    def print_summary(self):
+        saved = self.baseline_tokens - self.tokens
+        print(f"Near-duplicate blurbs: dropped {self.blurbs_dropped:,} across {self.profiles:,} profiles; "
+              f"dense_text tokens {self.baseline_tokens:,} -> {self.tokens:,} "
+              f"({saved:,} saved, {saved / max(self.baseline_tokens, 1):.1%})")
+
+
+# ==========================================
+# FINAL PROFILES
+# ==========================================
+def stable_publisher_id(pub_name):
+    """Deterministic id derived from the publisher name (unlike the per-process salted `hash()`)."""
+    return "pub_" + hashlib.sha1(pub_name.encode('utf-8')).hexdigest()[:16]
+
+
+def _dense_text(pub_name, blurbs):
+    return f"Publisher: {pub_name}\n\nTop Books:\n" + "\n---\n".join(blurbs)
+
+
+def build_profile(pub_name, data, terms=None, dedup_report=None):
+    """
+    Turns a publisher's merged aggregate into its profile record.
+    With integer-encoded input, `terms` maps the top-10 genre/shelf ids back to names.
+    Near-duplicate blurbs are left out of dense_text (see distinct_blurbs); `dedup_report` tallies the savings.
+    """
+    total_ratings = data["total_ratings"]
+    avg_rating = round(math.fsum(data["rating_sum"]) / total_ratings, 2) if total_ratings > 0 else 0.0
+    sorted_books = _top_books(data["books"])
+
+    comp_titles = [title for _, _, title, _ in sorted_books[:TOP_COMP_TITLES] if title]
+    top_blurbs = [blurb for _, _, _, blurb in sorted_books[:TOP_BLURBS] if blurb]
+    distinct, n_dropped = distinct_blurbs(top_blurbs)
+    dense_text = _dense_text(pub_name, distinct)
+    if dedup_report is not None:
+        dedup_report.add(dense_text, _dense_text(pub_name, top_blurbs), n_dropped)
+
+    top_genres = [g for g, c in data["genres"].most_common(10)]
+    top_shelves = [s for s, c in data["shelves"].most_common(10)]
+    if terms is not None:
+        top_genres = [terms[g] for g in top_genres]
+        top_shelves = [terms[s] for s in top_shelves]
+    sparse_keywords = list(dict.fromkeys(top_genres + top_shelves))  # Deduped, in a stable order
+
+    return {
+        "publisher_id": stable_publisher_id(pub_name),
+        "publisher_name": pub_name,
+        "publication_volume": data["vol"],
+        "avg_goodreads_rating": avg_rating,
+        "recent_comp_titles": comp_titles,
+        "active_genres": top_genres,
+        "dense_text": dense_text,
+        "sparse_text": " ".join(sparse_keywords)  # Pre-joined string for BM25
+    }
+
+
+def build_book_records(pub_name, data, n=BOOK_INDEX_BOOKS):
+    """
+    Books-file records (one vector each) for the publisher's `n` most-rated books, minus those without a blurb,
+    so there can be fewer than `n`. The aggregate must have kept that many books (aggregate_publishers).
+    """
+    publisher_id = stable_publisher_id(pub_name)
+    records = {}
+    for _, _, title, blurb in _top_books(data["books"], n):
+        if not blurb: continue
+        text = f"{title}\n\n{blurb}" if title else blurb
+        book_id = "book_" + hashlib.sha1(f"{publisher_id}\n{text}".encode('utf-8')).hexdigest()[:16]
+        records.setdefault(book_id, {"book_id": book_id, "publisher_id": publisher_id, "title": title, "text": text})
+    return list(records.values())
+
+
+def write_profiles(publishers, path, terms=None, dedup_report=None, books_path=None, book_index_books=BOOK_INDEX_BOOKS):
+    """
+    Writes one profile per publisher with at least 2 books. Returns the BM25 corpus ({publisher_id: sparse_text}).
+    With `books_path`, those publishers' top `book_index_books` books are also written there, one per line
+    (see build_book_records); pass the value the publishers were aggregated with.
+    """
+    bm25_corpus = {}
+    books_f = open(books_path, 'w', encoding='utf-8') if books_path else None
+    try:
+        with open(path, 'w', encoding='utf-8') as out_f:
+            for pub_name, data in tqdm(publishers.items(), desc="Finalizing Profiles"):
+                if data["vol"] < 2: continue
+
+                profile = build_profile(pub_name, data, terms, dedup_report)
+                # Save to BM25 Corpus to fit the model locally
+                bm25_corpus[profile["publisher_id"]] = profile["sparse_text"]
+                out_f.write(json.dumps(profile) + '\n')
+                if books_f is not None:
+                    for book in build_book_records(pub_name, data, book_index_books):
+                        books_f.write(json.dumps(book) + '\n')
+    finally:
+        if books_f is not None:
+            books_f.close()
+    return bm25_corpus
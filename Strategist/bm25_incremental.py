@@ -0,0 +1,161 @@
+import os
+import json
+import hashlib
+from collections import Counter
+
+from pinecone_text.sparse import BM25Encoder
+
+
+class IncrementalBM25:
+    """
+    BM25 statistics (doc_freq, n_docs, avgdl) maintained under document adds and removes instead of refitting.
+    Produces the same parameters BM25Encoder.fit would on the current corpus.
+
+    Document vectors only depend on avgdl, so for each document it remembers the avgdl its indexed sparse
+    vector was encoded with; `moved_documents` lists the ones a changed avgdl pushed past a tolerance.
+    """
+
+    def __init__(self, encoder=None):
+        self.encoder = encoder or BM25Encoder()
+        self.doc_freq = Counter()
+        self.n_docs = 0
+        self.total_len = 0
+        self.docs = {}  # doc_id -> {"text_hash", "indices", "tf", "encoded_avgdl"}
+
+    @property
+    def avgdl(self):
+        return self.total_len / self.n_docs if self.n_docs else 0.0
+
+    def add(self, doc_id, text):
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        indices, tf = self.encoder._tf(text)
+        self.docs[doc_id] = {
+            "text_hash": _text_hash(text), "indices": indices, "tf": tf, "encoded_avgdl": None,
+        }
+        if not indices: return  # Empty documents don't count towards the statistics (same as fit)
+        self.n_docs += 1
+        self.total_len += sum(tf)
+        self.doc_freq.update(indices)
+
+    def remove(self, doc_id):
+        doc = self.docs.pop(doc_id)
+        if not doc["indices"]: return
+        self.n_docs -= 1
+        self.total_len -= sum(doc["tf"])
+        self.doc_freq.subtract(doc["indices"])
+        for idx in doc["indices"]:
+            if self.doc_freq[idx] <= 0:
+                del self.doc_freq[idx]
+
+    def update_corpus(self, corpus):
+        """Brings the statistics in line with `corpus` ({doc_id: text}). Returns (added/changed ids, removed ids)."""
+        removed = [doc_id for doc_id in self.docs if doc_id not in corpus]
+        for doc_id in removed:
+            self.remove(doc_id)
+
+        changed = []
+        for doc_id, text in corpus.items():
+            doc = self.docs.get(doc_id)
+            if doc is None or doc["text_hash"] != _text_hash(text):
+                self.add(doc_id, text)
+                changed.append(doc_id)
+        return changed, removed
+
+    def _doc_values(self, doc, avgdl):
+        k1, b = self.encoder.k1, self.encoder.b
+        tf_sum = sum(doc["tf"])
+        return [tf / (k1 * (1.0 - b + b * (tf_sum / avgdl)) + tf) for tf in doc["tf"]]
+
+    def moved_documents(self, tolerance):
+        """Ids of encoded documents whose sparse values at the current avgdl differ by more than `tolerance`."""
+        avgdl = self.avgdl
+        moved = []
+        for doc_id, doc in self.docs.items():
+            encoded_avgdl = doc["encoded_avgdl"]
+            if encoded_avgdl is None or not doc["indices"] or encoded_avgdl == avgdl: continue
+            old = self._doc_values(doc, encoded_avgdl)
+            new = self._doc_values(doc, avgdl)
+            if max(abs(x - y) for x, y in zip(old, new)) > tolerance:
+                moved.append(doc_id)
+        return moved
+
+    def mark_encoded(self, doc_ids):
+        """Records that these documents' vectors are (about to be) indexed at the current avgdl."""
+        for doc_id in doc_ids:
+            self.docs[doc_id]["encoded_avgdl"] = self.avgdl
+
+    def to_encoder(self):
+        params = _tokenizer_params(self.encoder)
+        params.update(
+            avgdl=self.avgdl, n_docs=self.n_docs,
+            doc_freq={"indices": list(self.doc_freq), "values": [float(v) for v in self.doc_freq.values()]},
+        )
+        return BM25Encoder().set_params(**params)
+
+    def save(self, path):
+        state = {
+            "params": _tokenizer_params(self.encoder),
+            "n_docs": self.n_docs,
+            "total_len": self.total_len,
+            "doc_freq": {"indices": list(self.doc_freq), "values": list(self.doc_freq.values())},
+            "docs": self.docs,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        params = state["params"]
+        model = cls(BM25Encoder(
+            b=params["b"], k1=params["k1"], lower_case=params["lower_case"],
+            remove_punctuation=params["remove_punctuation"], remove_stopwords=params["remove_stopwords"],
+            stem=params["stem"], language=params["language"],
+        ))
+        model.n_docs = state["n_docs"]
+        model.total_len = state["total_len"]
+        model.doc_freq = Counter(dict(zip(state["doc_freq"]["indices"], state["doc_freq"]["values"])))
+        model.docs = state["docs"]
+        return model
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _tokenizer_params(encoder):
+    tokenizer = encoder._tokenizer
+    return {
+        "b": encoder.b, "k1": encoder.k1, "lower_case": tokenizer.lower_case,
+        "remove_punctuation": tokenizer.remove_punctuation, "remove_stopwords": tokenizer.remove_stopwords,
+        "stem": tokenizer.stem, "language": tokenizer.language,
+    }
+
+
+# ==========================================
+# MOVED-VECTOR HAND-OFF TO THE INDEX SYNC
+# ==========================================
+def load_moved_ids(path):
+    """{"base_weights", "weights", "ids"} left by incremental BM25 updates that the index sync hasn't applied yet."""
+    if not os.path.exists(path): return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def record_moved_ids(path, base_weights, weights, ids):
+    """
+    Adds `ids` to the pending moved set. `base_weights`/`weights` are hashes of the BM25 weights file
+    before/after the update; pending updates chain, keeping the oldest base.
+    """
+    pending = load_moved_ids(path)
+    if pending and pending["weights"] == base_weights:
+        base_weights = pending["base_weights"]
+        ids = list(dict.fromkeys(pending["ids"] + list(ids)))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"base_weights": base_weights, "weights": weights, "ids": list(ids)}, f)
+    os.replace(tmp_path, path)
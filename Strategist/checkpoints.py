@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+
+# Files larger than this are fingerprinted by size + mtime instead of hashed (the raw dumps are tens of GB)
+HASH_LIMIT_BYTES = 512 * 1024 * 1024
+
+
+def fingerprint(path):
+    """sha256 of the file (or size + mtime for huge files); None if it doesn't exist."""
+    if not os.path.exists(path): return None
+    stat = os.stat(path)
+    if stat.st_size > HASH_LIMIT_BYTES:
+        return f"size={stat.st_size},mtime={stat.st_mtime_ns}"
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Phase:
+    """
+    One step of the pipeline: `run()` plus the files it reads and writes (used to decide if it can be skipped).
+    `requires` are files that must still exist but that later phases keep modifying (the SQLite database).
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), requires=()):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.requires = list(requires)
+
+
+class PipelineCheckpoint:
+    """
+    Per-phase checkpoints in a JSON file: for each completed phase, the fingerprints of its inputs and outputs
+    and a run number that increases with every phase completed. A phase is skipped on re-run only if it completed,
+    its inputs and outputs are unchanged since, and no earlier phase completed after it (phases linked only through
+    the SQLite database, like finalize and export, have no fingerprints to catch that). Phases resume mid-way on
+    their own where they can (embed_and_upsert checkpoints its manifest every few batches).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.phases = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.phases = json.load(f)
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.phases, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def run_number(self, name):
+        """Order in which the phase last completed (0 if it never did, or before run numbers were recorded)."""
+        return self.phases.get(name, {}).get("run", 0)
+
+    def is_complete(self, phase):
+        done = self.phases.get(phase.name)
+        if not done or not all(os.path.exists(path) for path in phase.requires): return False
+        current = {path: fingerprint(path) for path in phase.inputs + phase.outputs}
+        return None not in current.values() and current == {**done["inputs"], **done["outputs"]}
+
+    def mark_complete(self, phase, started):
+        self.phases[phase.name] = {
+            "inputs": {path: fingerprint(path) for path in phase.inputs},
+            "outputs": {path: fingerprint(path) for path in phase.outputs},
+            "seconds": round(time.time() - started, 1),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "run": max((self.run_number(name) for name in self.phases), default=0) + 1,
+        }
+        self.save()
+
+
+def run_phases(phases, checkpoint, start=None, only=None, force=False):
+    """
+    Runs the phases in order, skipping completed ones. `start` reruns from that phase onwards,
+    `only` reruns a single phase (later phases then count as stale), and `force` ignores existing checkpoints.
+    """
+    names = [p.name for p in phases]
+    for name in (start, only):
+        if name is not None and name not in names:
+            raise ValueError(f"Unknown phase '{name}' (phases: {', '.join(names)})")
+
+    for i, phase in enumerate(phases):
+        if only is not None and phase.name != only: continue
+        rerun = force or only is not None or (start is not None and i >= names.index(start))
+        newer = [p.name for p in phases[:i] if checkpoint.run_number(p.name) > checkpoint.run_number(phase.name)]
+        if not rerun and not newer and checkpoint.is_complete(phase):
+            print(f"[{phase.name}] already complete, skipping")
+            continue
+
+        if newer and phase.name in checkpoint.phases:
+            print(f"[{phase.name}] stale ({', '.join(newer)} ran since), running...")
+        else:
+            print(f"[{phase.name}] running...")
+        started = time.time()
+        phase.run()
+        checkpoint.mark_complete(phase, started)
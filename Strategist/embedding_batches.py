@@ -0,0 +1,47 @@
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+EMBED_ENCODING = "cl100k_base"  # Tokenizer of the text-embedding-3 models
+CHARS_PER_TOKEN = 2  # Estimate used when the tokenizer is unavailable (low, for non-Latin / punctuation-heavy text)
+
+
+class TokenBudget:
+    """
+    Counts and truncates texts with the embedding model's tokenizer, so inputs are cut at a real token
+    limit instead of a character count. Falls back to a characters-per-token estimate without tiktoken.
+    """
+
+    def __init__(self, max_tokens_per_text, encoding_name=EMBED_ENCODING):
+        self.max_tokens_per_text = max_tokens_per_text
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:  # The encoding file is downloaded on first use
+                print(f"Could not load tokenizer '{encoding_name}' ({e}); estimating tokens from characters.")
+
+    def truncate(self, text):
+        """Returns (text cut to max_tokens_per_text, its token count)."""
+        if self.encoding is None:
+            text = text[:self.max_tokens_per_text * CHARS_PER_TOKEN]
+            return text, -(-len(text) // CHARS_PER_TOKEN)
+
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= self.max_tokens_per_text:
+            return text, len(tokens)
+        return self.encoding.decode(tokens[:self.max_tokens_per_text]), self.max_tokens_per_text
+
+
+def pack_by_tokens(token_counts, max_batch_tokens, max_batch_inputs):
+    """Greedily groups consecutive inputs into request batches under both limits. Yields lists of positions."""
+    batch, batch_tokens = [], 0
+    for i, n in enumerate(token_counts):
+        if batch and (batch_tokens + n > max_batch_tokens or len(batch) >= max_batch_inputs):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += n
+    if batch:
+        yield batch
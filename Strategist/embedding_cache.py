@@ -0,0 +1,87 @@
+import time
+import sqlite3
+import hashlib
+from array import array
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by a small SQLite file.
+    Entries are keyed by sha256(model + text) and hold the vector as packed float32 (what the API returns),
+    so a rebuild only pays for profiles whose truncated dense_text (or the model) changed.
+    When the stored vectors exceed `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path, model, max_bytes=1024 ** 3):
+        self.model = model
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, vector BLOB, n_bytes INTEGER, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts):
+        """Returns one vector (list of floats) or None per text, and refreshes the hits' LRU timestamps."""
+        keys = [self.key(t) for t in texts]
+        found = {}
+        for start in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ))
+
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            self.conn.commit()
+
+        vectors = [array('f', found[k]).tolist() if k in found else None for k in keys]
+        n_hits = len(keys) - vectors.count(None)
+        self.hits += n_hits
+        self.misses += len(keys) - n_hits
+        return vectors
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = array('f', vector).tobytes()
+            rows.append((self.key(text), blob, len(blob), now))
+        self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+        self.conn.commit()
+        self.evict()
+
+    def total_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(n_bytes), 0) FROM embeddings").fetchone()[0]
+
+    def evict(self):
+        """Drops least recently used entries until the stored vectors fit in max_bytes. Returns how many were dropped."""
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0: return 0
+
+        stale = []
+        for key, n_bytes in self.conn.execute("SELECT key, n_bytes FROM embeddings ORDER BY last_used"):
+            if excess <= 0: break
+            stale.append((key,))
+            excess -= n_bytes
+        self.conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+        self.conn.commit()
+        return len(stale)
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        print(f"Embedding cache: {self.hits:,} hits, {self.misses:,} misses ({rate:.1%} hit rate), "
+              f"{self.total_bytes() / 1e6:,.1f} MB stored")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+import threading
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def profile_hash(profile):
+    """Content hash of everything a profile contributes to its Pinecone record."""
+    return hashlib.sha256(json.dumps(profile, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def records_digest(settings, records):
+    """Hash of what a manifest says the namespace holds (its settings and every record's content hash)."""
+    return hashlib.sha256(json.dumps({"settings": settings, "records": records}, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_manifest(path):
+    """Returns the manifest of what is currently indexed, or None if there is none."""
+    if not os.path.exists(path): return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(path, settings, records, exports=None):
+    """
+    Atomically replaces the manifest, so a crash never leaves a half-written one behind. `exports` holds the
+    fingerprint each local export (local / book index) was last written from.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": MANIFEST_VERSION, "settings": settings, "records": records, "exports": exports or {}}, f)
+    os.replace(tmp_path, path)
+
+
+def diff_profiles(manifest, profiles, settings, force_ids=()):
+    """
+    Compares the profiles about to be indexed against the manifest of what is indexed.
+    `settings` captures everything outside the profiles that shapes the vectors (embedding model, BM25 weights);
+    if it changed, every profile counts as changed. Profiles in `force_ids` count as changed regardless.
+    Returns (changed profiles, ids to delete, the new manifest records).
+    """
+    indexed = manifest["records"] if manifest and manifest.get("settings") == settings else {}
+    records = {p["publisher_id"]: profile_hash(p) for p in profiles}
+    force_ids = set(force_ids)
+    changed = [
+        p for p in profiles
+        if p["publisher_id"] in force_ids or indexed.get(p["publisher_id"]) != records[p["publisher_id"]]
+    ]
+    removed = [pub_id for pub_id in (manifest or {}).get("records", {}) if pub_id not in records]
+    return changed, removed, records
+
+
+class SyncProgress:
+    """
+    The manifest as a sync goes: records what the namespace holds after each upsert/delete batch and saves it
+    every `save_every` batches, so a crashed sync resumes where it stopped instead of re-upserting everything.
+    Upserts may be reported from worker threads.
+    """
+
+    def __init__(self, path, settings, manifest, target, save_every=10):
+        self.path = path
+        self.settings = settings
+        self.target = target
+        self.save_every = save_every
+        self.records = dict(manifest["records"]) if manifest and manifest.get("settings") == settings else {}
+        self.exports = dict(manifest.get("exports", {})) if manifest else {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+    def mark_upserted(self, pub_ids):
+        with self._lock:
+            for pub_id in pub_ids:
+                self.records[pub_id] = self.target[pub_id]
+            self._batch_done()
+
+    def mark_deleted(self, pub_ids):
+        with self._lock:
+            for pub_id in pub_ids:
+                self.records.pop(pub_id, None)
+            self._batch_done()
+
+    def export_is_current(self, name, fingerprint):
+        return self.exports.get(name) == fingerprint
+
+    def mark_exported(self, name, fingerprint):
+        self.exports[name] = fingerprint
+        self.save()
+
+    def _batch_done(self):
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        save_manifest(self.path, self.settings, self.records, self.exports)
+        self._unsaved = 0
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import shutil
+
+# Blue/green versions of the publisher index. Each version is a namespace of the Pinecone index plus the BM25
+# weights its sparse vectors were encoded with; the alias file says which version serves queries.
+ALIAS_FILE = "index_alias.json"
+VERSIONS_DIR = "index_versions"
+LOCAL_INDEX_DIR = "local_index"  # In-process copy of a version's records (app/services/local_index.py)
+BOOK_INDEX_DIR = "book_index"  # Per-book vectors of a version (app/services/book_index.py)
+
+
+def load_alias(path=ALIAS_FILE):
+    if not os.path.exists(path):
+        return {"active": None, "previous": None, "versions": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_alias(alias, path=ALIAS_FILE):
+    """Atomically replaces the alias file: serving processes see either the old or the new version, never a mix."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(alias, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def version_dir(version, alias_path=ALIAS_FILE):
+    return os.path.join(os.path.dirname(os.path.abspath(alias_path)), VERSIONS_DIR, version)
+
+
+def manifest_path(version, alias_path=ALIAS_FILE):
+    return os.path.join(version_dir(version, alias_path), "manifest.json")
+
+
+def local_index_path(version, alias_path=ALIAS_FILE):
+    return os.path.join(version_dir(version, alias_path), LOCAL_INDEX_DIR)
+
+
+def book_index_path(version, alias_path=ALIAS_FILE):
+    return os.path.join(version_dir(version, alias_path), BOOK_INDEX_DIR)
+
+
+def remove_index_dirs(path):
+    """Removes a local export at `path`: its pointer file and every stamped build (app/services/local_index.py)."""
+    parent, name = os.path.dirname(path), os.path.basename(path)
+    if not os.path.isdir(parent): return
+    for entry in os.listdir(parent):
+        if entry == name or entry.startswith(name + "."):
+            target = os.path.join(parent, entry)
+            if os.path.isdir(target):
+                shutil.rmtree(target, ignore_errors=True)
+            else:
+                os.remove(target)
+
+
+def bm25_path(alias, version, alias_path=ALIAS_FILE):
+    """Absolute path of a version's BM25 weights (stored relative to the alias file)."""
+    return os.path.join(os.path.dirname(os.path.abspath(alias_path)), alias["versions"][version]["bm25_path"])
+
+
+def create_version(alias, bm25_weights_file, alias_path=ALIAS_FILE):
+    """Registers a new version (namespace) with a frozen copy of the BM25 weights. Returns its name."""
+    version = time.strftime("v%Y%m%d-%H%M%S")
+    os.makedirs(version_dir(version, alias_path), exist_ok=True)
+    shutil.copyfile(bm25_weights_file, os.path.join(version_dir(version, alias_path), "bm25.json"))
+
+    alias["versions"][version] = {
+        "namespace": version,
+        "bm25_path": os.path.join(VERSIONS_DIR, version, "bm25.json"),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "status": "building",
+    }
+    save_alias(alias, alias_path)
+    return version
+
+
+def update_version_bm25(alias, version, bm25_weights_file, alias_path=ALIAS_FILE):
+    """Swaps in updated BM25 weights for a version synced in place (incremental BM25 updates)."""
+    target = bm25_path(alias, version, alias_path)
+    shutil.copyfile(bm25_weights_file, target + ".tmp")
+    os.replace(target + ".tmp", target)
+
+
+def mark_built(alias, version, alias_path=ALIAS_FILE):
+    alias["versions"][version]["status"] = "built"
+    save_alias(alias, alias_path)
+
+
+def cutover(alias, version, alias_path=ALIAS_FILE):
+    """Points the alias at `version`; the version it replaces is kept as the rollback target."""
+    if alias["versions"].get(version, {}).get("status") not in ("built", "active", "retired"):
+        raise ValueError(f"Version '{version}' is not a finished build")
+    if alias["active"] == version: return
+
+    if alias["active"]:
+        alias["versions"][alias["active"]]["status"] = "retired"
+    alias["previous"], alias["active"] = alias["active"], version
+    alias["versions"][version]["status"] = "active"
+    save_alias(alias, alias_path)
+
+
+def rollback(alias, alias_path=ALIAS_FILE):
+    """Swaps the active and previous versions. Returns the version now serving."""
+    if not alias["previous"]:
+        raise ValueError("No previous version to roll back to")
+    cutover(alias, alias["previous"], alias_path)
+    return alias["active"]
+
+
+def drop_version(index, alias, version, alias_path=ALIAS_FILE):
+    """
+    Deletes a retired version's vectors and files. `index` is the Pinecone index (the namespace lives there
+    whichever backend serves queries); the version's local and book index exports are removed with its directory.
+    """
+    if version in (alias["active"], alias["previous"]):
+        raise ValueError(f"Version '{version}' is active or the rollback target")
+    index.delete(delete_all=True, namespace=alias["versions"][version]["namespace"])
+    for path in (local_index_path(version, alias_path), book_index_path(version, alias_path)):
+        remove_index_dirs(path)
+    shutil.rmtree(version_dir(version, alias_path), ignore_errors=True)
+    del alias["versions"][version]
+    save_alias(alias, alias_path)
@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import math
+import mmap
+import struct
+import hashlib
+from array import array
+from collections import deque
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+# ==========================================
+# RECORD PARSERS (shared by serial & parallel ingestion)
+# ==========================================
+def parse_goodreads_line(line):
+    """
+    Turns one Goodreads JSON line into (isbn13, blurb, average_rating, ratings_count, shelf names),
+    or None if it should be skipped. The writer encodes the shelf names with a TermVocabulary.
+    """
+    try:
+        book = json.loads(line)
+        isbn13 = book.get('isbn13', '').strip()
+        if not isbn13: return None
+
+        return (
+            isbn13,
+            book.get('description', ''),
+            float(book.get('average_rating', 0.0)),
+            int(book.get('ratings_count', 0)),
+            term_names([s['name'] for s in book.get('popular_shelves', [])])
+        )
+    except Exception:
+        return None
+
+
+def term_names(values):
+    """Shelf/genre names as strings (the writer's TermVocabulary keys on them); nulls and non-lists are dropped."""
+    if not isinstance(values, list): return []
+    return [v if isinstance(v, str) else json.dumps(v, sort_keys=True) for v in values if v is not None]
+
+
+def parse_goodreads_block(lines):
+    """Pool worker: parses a block of raw (bytes) Goodreads lines. Returns (lines seen, rows) in input order."""
+    rows = []
+    for line in lines:
+        row = parse_goodreads_line(line)
+        if row is not None:
+            rows.append(row)
+    return len(lines), rows
+
+
+def parse_openlibrary_line(line):
+    """
+    Turns one raw (bytes) OpenLibrary dump line into (isbn13, title, publisher, work key, subject names),
+    or None if it should be skipped. The writer encodes the subject names with a TermVocabulary.
+    """
+    cols = line.strip().split(b'\t')
+    if len(cols) < 5: return None
+    try:
+        fields = extract_edition_fields(cols[4])
+        if fields is None: return None
+
+        isbn13, publisher, title, subjects, works, authors = fields
+        if _isbn_filter is not None and isbn13 not in _isbn_filter: return None
+        return (isbn13, title, publisher, work_key(title, works, authors), term_names(subjects))
+    except Exception:
+        return None
+
+
+# ==========================================
+# WORK KEYS (editions of one work share one)
+# ==========================================
+_BRACKETED_RE = re.compile(r"[\(\[].*?[\)\]]")
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_title(title):
+    """Case-folded title without bracketed notes, subtitle or punctuation ("Dune (Deluxe Edition): A Novel" -> "dune")."""
+    if not isinstance(title, str): return ""
+    title = _BRACKETED_RE.sub(" ", title.casefold()).split(":")[0]
+    return _NON_WORD_RE.sub(" ", title).strip()
+
+
+def work_key(title, works, authors):
+    """
+    The edition's OpenLibrary work key (e.g. "/works/OL45883W") when it has one, otherwise its normalized title plus
+    first author key. None when neither is usable, so the edition stands alone as its own work.
+    """
+    if works and isinstance(works[0], dict) and works[0].get('key'):
+        return works[0]['key']
+    author = authors[0].get('key') if authors and isinstance(authors[0], dict) else None
+    title = normalize_title(title)
+    if not author or not title or title == "unknown": return None
+    return f"{title}|{author}"
+
+
+# ==========================================
+# DICTIONARY-ENCODED SHELVES & GENRES
+# ==========================================
+class TermVocabulary:
+    """
+    Maps shelf/genre names to integer ids backed by the `terms` table. Rows store their terms as packed
+    uint32 id arrays (BLOBs) instead of JSON text, so each distinct name is stored once.
+    Only the single SQLite writer process uses this; parsers hand it plain name lists.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids = {name: term_id for term_id, name in conn.execute('SELECT term_id, name FROM terms')}
+        self._next_id = max(self.ids.values(), default=0) + 1
+        self._pending = []
+
+    def encode(self, names):
+        ids = array('I')
+        for name in names:
+            term_id = self.ids.get(name)
+            if term_id is None:
+                term_id = self.ids[name] = self._next_id
+                self._next_id += 1
+                self._pending.append((term_id, name))
+            ids.append(term_id)
+        return ids.tobytes()
+
+    def encode_row(self, row):
+        """Replaces the trailing name list of a parsed row with its packed id BLOB."""
+        return row[:-1] + (self.encode(row[-1]),)
+
+    def flush(self):
+        """Writes newly assigned terms; call before committing the rows that reference them."""
+        if self._pending:
+            self.conn.executemany('INSERT INTO terms VALUES (?, ?)', self._pending)
+            self._pending = []
+
+
+def decode_term_ids(blob):
+    return array('I', blob).tolist() if blob else []
+
+
+# ==========================================
+# ISBN-13 JOIN PRE-FILTER
+# ==========================================
+class IsbnBloomFilter:
+    """
+    Compact Bloom filter over the Goodreads ISBN-13s. OpenLibrary rows whose ISBN is not in it can never
+    survive the JOIN in `export_joined_data`, so they are dropped before they reach SQLite.
+    False positives only cost an extra row; there are no false negatives.
+    """
+
+    _HEADER = struct.Struct('<QI')
+
+    def __init__(self, capacity, error_rate=0.01, n_bits=None, n_hashes=None):
+        capacity = max(1, capacity)
+        self.n_bits = n_bits or max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.n_hashes = n_hashes or max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, isbn13):
+        digest = hashlib.blake2b(isbn13.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def add(self, isbn13):
+        for pos in self._positions(isbn13):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, isbn13):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(isbn13))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self._HEADER.pack(self.n_bits, self.n_hashes))
+            f.write(self.bits)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            n_bits, n_hashes = cls._HEADER.unpack(f.read(cls._HEADER.size))
+            bloom = cls(1, n_bits=n_bits, n_hashes=n_hashes)
+            bloom.bits = bytearray(f.read())
+        return bloom
+
+
+# Set per process (the main process for the serial path, each pool worker via `init_isbn_filter`)
+_isbn_filter = None
+
+
+def init_isbn_filter(path):
+    """Loads the ISBN filter used by `parse_openlibrary_line`; None disables filtering. Also usable as a Pool initializer."""
+    global _isbn_filter
+    _isbn_filter = IsbnBloomFilter.load(path) if path else None
+
+
+# ==========================================
+# SELECTIVE EDITION FIELD EXTRACTION
+# ==========================================
+def extract_edition_fields(raw):
+    """
+    Returns (isbn13, publisher, title, subjects, works, authors) for an edition JSON blob, or None if the row can't
+    join (no `isbn_13` or no `publishers`). Same values as `json.loads(raw)` followed by `.get(...)` lookups.
+    Rows missing either key are rejected on a substring check before any parsing. Survivors are parsed with
+    orjson when it is installed, otherwise with `json.loads`.
+    """
+    if b'"isbn_13"' not in raw or b'"publishers"' not in raw: return None
+
+    isbn13_list, pubs, title, subjects, works, authors = _parse_edition_fields(raw)
+    if not isbn13_list or not pubs: return None
+    return str(isbn13_list[0]).strip(), pubs[0], title, subjects, works, authors
+
+
+def _parse_edition_fields(raw):
+    """Full parse (orjson when installed, json otherwise)."""
+    book = None
+    if orjson is not None:
+        try:
+            book = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    if book is None:
+        book = json.loads(raw)
+    return (
+        book.get('isbn_13', []), book.get('publishers', []), book.get('title', 'Unknown'), book.get('subjects', []),
+        book.get('works', []), book.get('authors', []),
+    )
+
+
+def parse_openlibrary_range(task):
+    """Pool worker: parses the lines of one newline-aligned byte range. Returns (bytes covered, rows) in file order."""
+    path, start, end = task
+    rows = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        while mm.tell() < end:
+            row = parse_openlibrary_line(mm.readline())
+            if row is not None:
+                rows.append(row)
+    return end - start, rows
+
+
+def split_byte_ranges(path, chunk_bytes):
+    """Splits a file into (start, end) byte ranges of ~`chunk_bytes`, each ending right after a newline."""
+    size = os.path.getsize(path)
+    if size == 0: return []
+
+    ranges = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                newline = mm.find(b'\n', end - 1)
+                end = size if newline == -1 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def iter_line_blocks(f, block_bytes):
+    """Reads a file object in blocks of whole lines (roughly `block_bytes` each)."""
+    while True:
+        lines = f.readlines(block_bytes)
+        if not lines: return
+        yield lines
+
+
+# ==========================================
+# ORDERED, BOUNDED POOL MAP
+# ==========================================
+def bounded_imap(pool, func, iterable, max_pending):
+    """
+    Like `pool.imap`, but never reads more than `max_pending` items ahead of the consumer.
+    `Pool.imap` drains its input eagerly, which would pull the whole dump into memory.
+    Results are yielded in input order, so INSERT OR IGNORE keeps the same "first row wins" semantics.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
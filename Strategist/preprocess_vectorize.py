@@ -1,12 +1,64 @@
 import os
 import json
+import argparse
 import gzip
+import time
+import random
+import sys
 import sqlite3
-from collections import Counter
+import multiprocessing
+from itertools import islice
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from openai import OpenAI
+import numpy as np
+from openai import APIConnectionError, InternalServerError, OpenAI, RateLimitError
 from pinecone import Pinecone, ServerlessSpec
-from pinecone_text.sparse import BM25Encoder
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from app.services.bm25 import FastBM25Encoder  # Same vectors as pinecone_text's BM25Encoder, computed faster
+from app.services.book_index import BOOKS_FILE as BOOK_INDEX_FILE, finish_book_index
+from app.services.local_index import new_index_dir, resolve_index_dir, write_local_index
+from bm25_incremental import IncrementalBM25, load_moved_ids, record_moved_ids
+from checkpoints import Phase, PipelineCheckpoint, run_phases
+from embedding_batches import TokenBudget, pack_by_tokens
+from embedding_cache import EmbeddingCache
+from index_sync import SyncProgress, diff_profiles, file_sha256, load_manifest, records_digest
+from index_versions import (
+    bm25_path,
+    book_index_path,
+    create_version,
+    cutover,
+    load_alias,
+    local_index_path,
+    manifest_path,
+    mark_built,
+    update_version_bm25,
+)
+from aggregation import BOOK_INDEX_BOOKS, BlurbDedupReport, aggregate_publishers, load_terms, terms_path, write_profiles
+from ingest import (
+    IsbnBloomFilter,
+    TermVocabulary,
+    bounded_imap,
+    decode_term_ids,
+    init_isbn_filter,
+    iter_line_blocks,
+    parse_goodreads_block,
+    parse_goodreads_line,
+    parse_openlibrary_line,
+    parse_openlibrary_range,
+    split_byte_ranges,
+)
 
 # ==========================================
 # CONFIGURATION & CREDENTIALS
@@ -15,11 +67,68 @@ DB_PATH = "slushpilot_data.db"
 GOODREADS_FILE = "C:\\Users\\harel\\Downloads\\goodreads_books.json.gz"
 OPENLIBRARY_FILE = "C:\\Users\\harel\\Downloads\\ol_dump_editions_2025-12-31.txt"
 MERGED_FILE = "slushpilot_merged_books.jsonl"
+MERGED_PARQUET_FILE = "slushpilot_merged_books.parquet"
+MERGED_FORMAT = "parquet" if pa is not None else "jsonl"  # "parquet" (columnar, needs pyarrow) or "jsonl"
+MERGED_ROW_GROUP_SIZE = 50000
+DEDUPE_WORKS = True  # Export one edition per (publisher, work): the most-rated one (see export_joined_data)
+HEAVY_HITTERS_CAPACITY = None  # e.g. 200 to count genres/shelves with a bounded Space-Saving sketch
 PROFILES_FILE = "slushpilot_publisher_profiles.jsonl"
+BOOKS_FILE = "slushpilot_publisher_books.jsonl"  # Top books per publisher, one vector each for book-level retrieval
 BM25_WEIGHTS_FILE = "bm25_publisher_weights.json"
+PIPELINE_CHECKPOINT_FILE = "pipeline_checkpoint.json"
+
+# Incremental BM25: corpus statistics kept between runs, and the unchanged publishers whose sparse vectors
+# an update moved by more than the tolerance (re-upserted by the next embed_and_upsert)
+BM25_STATE_FILE = "bm25_state.json"
+BM25_MOVED_IDS_FILE = "bm25_moved_ids.json"
+BM25_MOVE_TOLERANCE = 0.01
+BM25_ENCODE_WORKERS = os.cpu_count() or 1  # Processes encoding sparse vectors before an index sync
+
+# Parallel ingestion: number of parser processes (1 = original single-core path)
+INGEST_WORKERS = os.cpu_count() or 1
+INGEST_BLOCK_BYTES = 4 * 1024 * 1024  # Decompressed bytes handed to a parser process at a time
+OPENLIBRARY_RANGE_BYTES = 32 * 1024 * 1024  # Size of each memory-mapped byte range of the OpenLibrary dump
+
+# Optional join pre-filter: Bloom filter of Goodreads ISBN-13s, used to skip OpenLibrary rows that can't join
+ISBN_FILTER_FILE = "goodreads_isbn13.bloom"
+ISBN_FILTER_ERROR_RATE = 0.01
+
+# Bulk-load mode: staging tables without a primary key, deduplicated and indexed once by finalize_bulk_load()
+BULK_LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA cache_size = -1048576",  # 1 GiB page cache (negative = KiB)
+]
+TABLE_COLUMNS = {
+    "goodreads": "isbn13 TEXT{pk}, blurb TEXT, average_rating REAL, ratings_count INTEGER, shelf_ids BLOB",
+    "openlibrary": "isbn13 TEXT{pk}, title TEXT, publisher TEXT, work_key TEXT, genre_ids BLOB",
+}
 
 PINECONE_INDEX_NAME = "slushpilot-publishers"
+INDEX_ALIAS_FILE = "index_alias.json"  # Which versioned namespace serves queries (config.STRATEGIST_INDEX_ALIAS_PATH)
+PINECONE_DELETE_BATCH_SIZE = 1000
+SYNC_CHECKPOINT_EVERY = 10  # Upsert batches between manifest checkpoints (a crashed sync resumes from the last one)
 EMBEDDING_MODEL = "RPRTHPB-text-embedding-3-small"
+EMBEDDING_CACHE_PATH = "embedding_cache.db"  # Set to None to always call the embeddings API
+EMBEDDING_CACHE_MAX_BYTES = 1024 ** 3  # LRU eviction beyond ~1 GiB of float32 vectors
+EMBED_MAX_TOKENS = 8191  # Per-input limit of text-embedding-3-small
+EMBED_BATCH_TOKENS = 100_000  # Tokens packed into one embeddings request (the API caps a request at 300k)
+EMBED_BATCH_INPUTS = 1000  # Inputs per embeddings request (the API caps it at 2048)
+EMBED_CONCURRENCY = 4  # Embeddings requests in flight at once in pipelined mode
+EMBED_MAX_RETRIES = 6  # Retries of an embeddings request after a 429 / 5xx / connection error
+EMBED_RETRY_BASE_SECONDS = 1.0  # First backoff; doubles per retry, with jitter
+UPSERT_BATCH_SIZE = 100  # OpenAI and Pinecone sweet spot
+UPSERT_CONCURRENCY = 2  # Pinecone upserts in flight at once in pipelined mode
+# Also write each synced version as a local index (config.STRATEGIST_BACKEND = "local"); dense vectors of
+# unchanged profiles come from the embedding cache, so this is skipped when EMBEDDING_CACHE_PATH is None
+EXPORT_LOCAL_INDEX = True
+# Also embed every book in BOOKS_FILE into the version's book index (config.STRATEGIST_RETRIEVAL = "books"); it
+# pools hits into the publishers of the local index, so it needs EXPORT_LOCAL_INDEX. One embedding per book:
+# off by default, and unchanged books reuse the previous book index's vectors rather than the embedding cache.
+# Catalogs of BOOK_ANN_MIN_BOOKS books or more also get an IVF-PQ index (None: never)
+EXPORT_BOOK_INDEX = False
+BOOK_ANN_MIN_BOOKS = 200_000
 
 # Initialize Clients
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url="https://api.llmod.ai")
@@ -29,194 +138,460 @@ pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 # ==========================================
 # PHASE 1 & 2: STREAMING & DB INGESTION
 # ==========================================
-def setup_database():
+def setup_database(bulk_load=False):
+    """
+    Opens DB_PATH and creates the ingestion tables.
+    With bulk_load, loading pragmas are applied and new tables are created without a primary key,
+    so inserts are plain appends; call finalize_bulk_load() before export_joined_data().
+    """
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    cursor.execute(
-        '''CREATE TABLE IF NOT EXISTS goodreads (isbn13 TEXT PRIMARY KEY, blurb TEXT, average_rating REAL, ratings_count INTEGER, popular_shelves TEXT)''')
-    cursor.execute(
-        '''CREATE TABLE IF NOT EXISTS openlibrary (isbn13 TEXT PRIMARY KEY, title TEXT, publisher TEXT, genres TEXT)''')
+    if bulk_load:
+        for pragma in BULK_LOAD_PRAGMAS:
+            cursor.execute(pragma)
+
+    pk = "" if bulk_load else " PRIMARY KEY"
+    for table, columns in TABLE_COLUMNS.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns.format(pk=pk)})")
+    # Shared vocabulary for the packed shelf_ids / genre_ids arrays
+    cursor.execute("CREATE TABLE IF NOT EXISTS terms (term_id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
     conn.commit()
     return conn
 
 
-def process_goodreads(conn):
-    """Streams Goodreads. (Uses a line counter because tracking compressed bytes is inaccurate)"""
+def finalize_bulk_load(conn):
+    """
+    Deduplicates bulk-loaded staging tables in one pass and rebuilds them with their ISBN primary key.
+    Keeps the first row per ISBN (lowest rowid), matching what INSERT OR IGNORE would have kept.
+    """
     cursor = conn.cursor()
+    for table, columns in TABLE_COLUMNS.items():
+        has_pk = any(col[5] for col in cursor.execute(f"PRAGMA table_info({table})"))
+        if has_pk: continue
+
+        started = time.time()
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_dedup")
+        cursor.execute(f"CREATE TABLE {table}_dedup ({columns.format(pk=' PRIMARY KEY')})")
+        cursor.execute(f'''
+            INSERT INTO {table}_dedup
+            SELECT * FROM {table}
+            WHERE rowid IN (SELECT MIN(rowid) FROM {table} GROUP BY isbn13)
+            ORDER BY isbn13
+        ''')
+        n_rows = cursor.rowcount
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_dedup RENAME TO {table}")
+        conn.commit()
+        _report_throughput(f"Dedup + index {table}", n_rows, started)
+
+
+def _report_throughput(phase, n_rows, started):
+    elapsed = max(time.time() - started, 1e-9)
+    print(f"{phase}: {n_rows:,} rows in {elapsed:.1f}s ({n_rows / elapsed:,.0f} rows/sec)")
+
+
+def process_goodreads(conn, workers=1, build_isbn_filter=False):
+    """
+    Streams Goodreads. (Uses a line counter because tracking compressed bytes is inaccurate)
+    With workers > 1, this process only decompresses and writes to SQLite while a pool parses blocks of lines.
+    With build_isbn_filter, also writes the ISBN-13 Bloom filter that `process_openlibrary` can pre-filter with.
+    """
+    started = time.time()
+    if workers > 1:
+        n_rows = _process_goodreads_parallel(conn, workers)
+    else:
+        n_rows = _process_goodreads_serial(conn)
+    _report_throughput("Goodreads ingest", n_rows, started)
+
+    if build_isbn_filter:
+        build_goodreads_isbn_filter(conn)
+
+
+def _process_goodreads_serial(conn):
+    cursor = conn.cursor()
+    vocab = TermVocabulary(conn)
     batch = []
+    n_rows = 0
 
     # We use a standard line counter for gzip because uncompressed byte length isn't known upfront
     with gzip.open(GOODREADS_FILE, 'rt', encoding='utf-8') as f:
         for line in tqdm(f, desc="Ingesting Goodreads (Lines)"):
-            try:
-                book = json.loads(line)
-                isbn13 = book.get('isbn13', '').strip()
-                if not isbn13: continue
-
-                batch.append((
-                    isbn13,
-                    book.get('description', ''),
-                    float(book.get('average_rating', 0.0)),
-                    int(book.get('ratings_count', 0)),
-                    json.dumps(book.get('popular_shelves', []))
-                ))
+            row = parse_goodreads_line(line)
+            if row is None: continue
+            batch.append(vocab.encode_row(row))
+
+            if len(batch) >= 10000:
+                n_rows += len(batch)
+                vocab.flush()
+                cursor.executemany('INSERT OR IGNORE INTO goodreads VALUES (?, ?, ?, ?, ?)', batch)
+                conn.commit()
+                batch = []
+
+    if batch:
+        n_rows += len(batch)
+        vocab.flush()
+        cursor.executemany('INSERT OR IGNORE INTO goodreads VALUES (?, ?, ?, ?, ?)', batch)
+        conn.commit()
+    return n_rows
 
+
+def _process_goodreads_parallel(conn, workers):
+    """One reader streams decompressed blocks to the pool; parsed rows come back in order to a single writer."""
+    cursor = conn.cursor()
+    vocab = TermVocabulary(conn)
+    batch = []
+    n_rows = 0
+
+    with gzip.open(GOODREADS_FILE, 'rb') as f, multiprocessing.Pool(workers) as pool:
+        with tqdm(desc=f"Ingesting Goodreads (Lines, {workers} workers)") as pbar:
+            blocks = iter_line_blocks(f, INGEST_BLOCK_BYTES)
+            for n_lines, rows in bounded_imap(pool, parse_goodreads_block, blocks, workers * 2):
+                pbar.update(n_lines)
+                batch.extend(vocab.encode_row(row) for row in rows)
                 if len(batch) >= 10000:
+                    n_rows += len(batch)
+                    vocab.flush()
                     cursor.executemany('INSERT OR IGNORE INTO goodreads VALUES (?, ?, ?, ?, ?)', batch)
                     conn.commit()
                     batch = []
-            except Exception:
-                pass
 
     if batch:
+        n_rows += len(batch)
+        vocab.flush()
         cursor.executemany('INSERT OR IGNORE INTO goodreads VALUES (?, ?, ?, ?, ?)', batch)
         conn.commit()
+    return n_rows
 
 
-def process_openlibrary(conn):
-    """Streams OpenLibrary using the byte-size tracker."""
+def build_goodreads_isbn_filter(conn):
+    """Builds the Bloom filter from every ISBN-13 in the goodreads table and saves it to ISBN_FILTER_FILE."""
+    cursor = conn.cursor()
+    n_rows = cursor.execute('SELECT COUNT(*) FROM goodreads').fetchone()[0]
+    bloom = IsbnBloomFilter(n_rows, ISBN_FILTER_ERROR_RATE)
+    for (isbn13,) in tqdm(cursor.execute('SELECT isbn13 FROM goodreads'), total=n_rows, desc="Building ISBN Filter"):
+        bloom.add(isbn13)
+    bloom.save(ISBN_FILTER_FILE)
+    print(f"ISBN filter: {n_rows:,} ISBNs, {len(bloom.bits) / 1e6:.2f} MB, {bloom.n_hashes} hashes -> {ISBN_FILTER_FILE}")
+
+
+def process_openlibrary(conn, workers=1, use_isbn_filter=False):
+    """
+    Streams OpenLibrary using the byte-size tracker.
+    With workers > 1, the dump is memory-mapped and split into newline-aligned byte ranges parsed by a pool.
+    With use_isbn_filter, rows whose ISBN-13 isn't in the Goodreads filter (ISBN_FILTER_FILE) are never inserted.
+    """
+    filter_path = ISBN_FILTER_FILE if use_isbn_filter else None
+    if filter_path and not os.path.exists(filter_path):
+        raise FileNotFoundError(f"Missing ISBN filter: {filter_path} (run process_goodreads with build_isbn_filter=True)")
+
+    started = time.time()
+    if workers > 1:
+        n_rows = _process_openlibrary_parallel(conn, workers, filter_path)
+    else:
+        init_isbn_filter(filter_path)
+        try:
+            n_rows = _process_openlibrary_serial(conn)
+        finally:
+            init_isbn_filter(None)
+    _report_throughput("OpenLibrary ingest", n_rows, started)
+
+
+def _process_openlibrary_serial(conn):
     cursor = conn.cursor()
+    vocab = TermVocabulary(conn)
     batch = []
+    n_rows = 0
     total_bytes = os.path.getsize(OPENLIBRARY_FILE)
 
     with tqdm(total=total_bytes, unit='B', unit_scale=True, desc="Ingesting OpenLibrary (Bytes)") as pbar:
-        with open(OPENLIBRARY_FILE, 'r', encoding='utf-8') as f:
+        with open(OPENLIBRARY_FILE, 'rb') as f:
             for line in f:
-                pbar.update(len(line.encode('utf-8')))
-                cols = line.strip().split('\t')
-                if len(cols) >= 5:
-                    try:
-                        book = json.loads(cols[4])
-                        isbn13_list = book.get('isbn_13', [])
-                        if not isbn13_list: continue
-
-                        pubs = book.get('publishers', [])
-                        if not pubs: continue
-
-                        batch.append((
-                            str(isbn13_list[0]).strip(),
-                            book.get('title', 'Unknown'),
-                            pubs[0],
-                            json.dumps(book.get('subjects', []))
-                        ))
-
-                        if len(batch) >= 10000:
-                            cursor.executemany('INSERT OR IGNORE INTO openlibrary VALUES (?, ?, ?, ?)', batch)
-                            conn.commit()
-                            batch = []
-                    except Exception:
-                        pass
+                pbar.update(len(line))
+                row = parse_openlibrary_line(line)
+                if row is None: continue
+                batch.append(vocab.encode_row(row))
+
+                if len(batch) >= 10000:
+                    n_rows += len(batch)
+                    vocab.flush()
+                    cursor.executemany('INSERT OR IGNORE INTO openlibrary VALUES (?, ?, ?, ?, ?)', batch)
+                    conn.commit()
+                    batch = []
+
+    if batch:
+        n_rows += len(batch)
+        vocab.flush()
+        cursor.executemany('INSERT OR IGNORE INTO openlibrary VALUES (?, ?, ?, ?, ?)', batch)
+        conn.commit()
+    return n_rows
+
+
+def _process_openlibrary_parallel(conn, workers, filter_path=None):
+    """Workers parse byte ranges straight from the mmap; rows come back in file order to a single writer."""
+    cursor = conn.cursor()
+    vocab = TermVocabulary(conn)
+    batch = []
+    n_rows = 0
+    total_bytes = os.path.getsize(OPENLIBRARY_FILE)
+    tasks = [(OPENLIBRARY_FILE, start, end) for start, end in split_byte_ranges(OPENLIBRARY_FILE, OPENLIBRARY_RANGE_BYTES)]
+
+    desc = f"Ingesting OpenLibrary (Bytes, {workers} workers)"
+    with tqdm(total=total_bytes, unit='B', unit_scale=True, desc=desc) as pbar, \
+            multiprocessing.Pool(workers, init_isbn_filter, (filter_path,)) as pool:
+        for n_bytes, rows in bounded_imap(pool, parse_openlibrary_range, tasks, workers * 2):
+            pbar.update(n_bytes)
+            batch.extend(vocab.encode_row(row) for row in rows)
+            if len(batch) >= 10000:
+                n_rows += len(batch)
+                vocab.flush()
+                cursor.executemany('INSERT OR IGNORE INTO openlibrary VALUES (?, ?, ?, ?, ?)', batch)
+                conn.commit()
+                batch = []
 
     if batch:
-        cursor.executemany('INSERT OR IGNORE INTO openlibrary VALUES (?, ?, ?, ?)', batch)
+        n_rows += len(batch)
+        vocab.flush()
+        cursor.executemany('INSERT OR IGNORE INTO openlibrary VALUES (?, ?, ?, ?, ?)', batch)
         conn.commit()
+    return n_rows
 
 
 # ==========================================
 # PHASE 3: SQL JOIN & EXPORT
 # ==========================================
-def export_joined_data(conn):
+JOINED_COLUMNS = "ol.isbn13, ol.title, ol.publisher, ol.genre_ids, gr.blurb, gr.average_rating, gr.ratings_count, gr.shelf_ids"
+
+
+def export_joined_data(conn, fmt="jsonl", dedupe_works=DEDUPE_WORKS):
+    """
+    Joins OpenLibrary editions to Goodreads by ISBN-13 and writes the merged dataset.
+    With dedupe_works, editions of one work (same OpenLibrary work key, or normalized title + author;
+    see ingest.work_key) from the same publisher collapse to their most-rated edition, so a work counts
+    once towards publication_volume, the ratings and the top books. Editions without a work key stay separate.
+    """
     print("Joining datasets in SQLite...")
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT ol.isbn13, ol.title, ol.publisher, ol.genres, gr.blurb, gr.average_rating, gr.ratings_count, gr.popular_shelves
-        FROM openlibrary ol JOIN goodreads gr ON ol.isbn13 = gr.isbn13
-    ''')
-
+    if dedupe_works:
+        cursor.execute(f'''
+            SELECT isbn13, title, publisher, genre_ids, blurb, average_rating, ratings_count, shelf_ids FROM (
+                SELECT {JOINED_COLUMNS}, ROW_NUMBER() OVER (
+                    PARTITION BY TRIM(ol.publisher), COALESCE(ol.work_key, ol.isbn13)
+                    ORDER BY gr.ratings_count DESC, ol.isbn13
+                ) AS edition_rank
+                FROM openlibrary ol JOIN goodreads gr ON ol.isbn13 = gr.isbn13
+            ) WHERE edition_rank = 1
+        ''')
+    else:
+        cursor.execute(f"SELECT {JOINED_COLUMNS} FROM openlibrary ol JOIN goodreads gr ON ol.isbn13 = gr.isbn13")
+
+    if fmt == "parquet":
+        _export_parquet(conn, cursor)
+        return
+
+    names = dict(conn.execute('SELECT term_id, name FROM terms'))
     with open(MERGED_FILE, 'w', encoding='utf-8') as f:
         for row in tqdm(cursor, desc="Exporting Merged Data"):
             record = {
                 "isbn13": row[0], "title": row[1], "publisher": row[2],
-                "genres": json.loads(row[3]) if row[3] else [], "blurb": row[4],
+                "genres": [names[t] for t in decode_term_ids(row[3])], "blurb": row[4],
                 "average_rating": float(row[5]) if row[5] else 0.0,
                 "ratings_count": int(row[6]) if row[6] else 0,
-                "popular_shelves": json.loads(row[7]) if row[7] else []
+                "popular_shelves": [{"name": names[t]} for t in decode_term_ids(row[7])]
             }
             f.write(json.dumps(record) + '\n')
 
 
+def _merged_schema():
+    return pa.schema([
+        ("isbn13", pa.string()),
+        ("title", pa.string()),
+        ("publisher", pa.string()),
+        ("genre_ids", pa.list_(pa.uint32())),
+        ("blurb", pa.string()),
+        ("average_rating", pa.float64()),
+        ("ratings_count", pa.int64()),
+        ("shelf_ids", pa.list_(pa.uint32())),  # Shelf ids only; the per-shelf counts are never used downstream
+    ])
+
+
+def _export_parquet(conn, cursor):
+    """
+    Writes the joined rows as zstd-compressed Parquet, one row group per MERGED_ROW_GROUP_SIZE rows.
+    Genres and shelves stay integer-encoded; the ids are renumbered densely over the joined rows and
+    their names written alongside (see `aggregation.terms_path`).
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed. Install it or use fmt='jsonl'.")
+
+    schema = _merged_schema()
+    remap = {}
+
+    def dense_ids(blob):
+        return [remap.setdefault(t, len(remap)) for t in decode_term_ids(blob)]
+
+    def text(value):
+        # SQLite hands back whatever type a row was bound with; Arrow needs one type per column
+        if value is None or isinstance(value, str): return value
+        return value.decode('utf-8', 'replace') if isinstance(value, bytes) else str(value)
+
+    with pq.ParquetWriter(MERGED_PARQUET_FILE, schema, compression="zstd") as writer:
+        columns = {name: [] for name in schema.names}
+        for row in tqdm(cursor, desc="Exporting Merged Data (Parquet)"):
+            columns["isbn13"].append(text(row[0]))
+            columns["title"].append(text(row[1]))
+            columns["publisher"].append(text(row[2]))
+            columns["genre_ids"].append(dense_ids(row[3]))
+            columns["blurb"].append(text(row[4]))
+            columns["average_rating"].append(float(row[5]) if row[5] else 0.0)
+            columns["ratings_count"].append(int(row[6]) if row[6] else 0)
+            columns["shelf_ids"].append(dense_ids(row[7]))
+
+            if len(columns["isbn13"]) >= MERGED_ROW_GROUP_SIZE:
+                writer.write_table(pa.table(columns, schema=schema))
+                columns = {name: [] for name in schema.names}
+
+        if columns["isbn13"]:
+            writer.write_table(pa.table(columns, schema=schema))
+
+    names = dict(conn.execute('SELECT term_id, name FROM terms'))
+    with open(terms_path(MERGED_PARQUET_FILE), 'w', encoding='utf-8') as f:
+        json.dump([names[t] for t in remap], f)
+
+
 # ==========================================
 # PHASE 4: AGGREGATE PROFILES & FIT BM25
 # ==========================================
-def aggregate_and_fit_bm25():
-    publishers = {}
-    total_bytes = os.path.getsize(MERGED_FILE)
+def aggregate_and_fit_bm25(fmt="jsonl", workers=1, heavy_hitters=None, incremental_bm25=False, book_index_books=0):
+    """
+    Builds publisher profiles from the merged dataset and fits BM25 on their keywords.
+    With workers > 1, shards are aggregated in a process pool and merged in shard order;
+    the profiles file is byte-identical to the single-process run.
+    With heavy_hitters (a capacity), genre/shelf top-10s come from approximate Space-Saving sketches.
+    Near-duplicate blurbs are dropped from dense_text (aggregation.BLURB_DEDUP_THRESHOLD); the tokens saved are reported.
+    With incremental_bm25, the BM25 statistics in BM25_STATE_FILE are updated by adding/removing the publishers
+    that changed instead of refitting, and publishers whose indexed sparse vectors moved more than
+    BM25_MOVE_TOLERANCE are recorded in BM25_MOVED_IDS_FILE for the next index sync.
+    With book_index_books (aggregation.BOOK_INDEX_BOOKS when EXPORT_BOOK_INDEX is on), that many top books per
+    publisher are kept and written to BOOKS_FILE for the book index; otherwise no books file is written.
+    """
+    merged_path = MERGED_PARQUET_FILE if fmt == "parquet" else MERGED_FILE
 
     # 1. Group by Publisher
-    with tqdm(total=total_bytes, unit='B', unit_scale=True, desc="Aggregating Profiles") as pbar:
-        with open(MERGED_FILE, 'r', encoding='utf-8') as f:
-            for line in f:
-                pbar.update(len(line.encode('utf-8')))
-                book = json.loads(line)
-                pub = book.get('publisher', '').strip()
-                if not pub or pub.lower() == 'unknown publisher': continue
-
-                if pub not in publishers:
-                    publishers[pub] = {"vol": 0, "total_ratings": 0, "rating_sum": 0.0, "genres": Counter(),
-                                       "shelves": Counter(), "books": []}
-
-                p = publishers[pub]
-                p["vol"] += 1
-                p["genres"].update(book.get('genres', []))
-                p["shelves"].update([s['name'] for s in book.get('popular_shelves', [])])
-
-                cnt = book.get('ratings_count', 0)
-                p["total_ratings"] += cnt
-                p["rating_sum"] += (book.get('average_rating', 0.0) * cnt)
-                p["books"].append(
-                    {"title": book.get('title', ''), "blurb": book.get('blurb', ''), "ratings_count": cnt})
-
-    # 2. Build Profiles & Prepare Corpus for BM25
-    bm25_corpus = []
-
-    with open(PROFILES_FILE, 'w', encoding='utf-8') as out_f:
-        for pub_name, data in tqdm(publishers.items(), desc="Finalizing Profiles"):
-            if data["vol"] < 2: continue
-
-            avg_rating = round(data["rating_sum"] / data["total_ratings"], 2) if data["total_ratings"] > 0 else 0.0
-            sorted_books = sorted(data["books"], key=lambda x: x["ratings_count"], reverse=True)
-
-            comp_titles = [b["title"] for b in sorted_books[:5] if b["title"]]
-            top_blurbs = [b["blurb"] for b in sorted_books[:15] if b["blurb"]]
-            dense_text = f"Publisher: {pub_name}\n\nTop Books:\n" + "\n---\n".join(top_blurbs)
-
-            top_genres = [g for g, c in data["genres"].most_common(10)]
-            top_shelves = [s for s, c in data["shelves"].most_common(10)]
-            sparse_keywords = list(set(top_genres + top_shelves))
-
-            # Save to BM25 Corpus to fit the model locally
-            bm25_corpus.append(" ".join(sparse_keywords))
-
-            profile = {
-                "publisher_id": f"pub_{hash(pub_name) % 100000000}",
-                "publisher_name": pub_name,
-                "publication_volume": data["vol"],
-                "avg_goodreads_rating": avg_rating,
-                "recent_comp_titles": comp_titles,
-                "active_genres": top_genres,
-                "dense_text": dense_text,
-                "sparse_text": " ".join(sparse_keywords)  # Pre-joined string for BM25
-            }
-            out_f.write(json.dumps(profile) + '\n')
+    started = time.time()
+    publishers = aggregate_publishers(fmt, merged_path, workers=workers, heavy_hitters=heavy_hitters,
+                                      book_index_books=book_index_books)
+    print(f"Aggregated {len(publishers):,} publishers in {time.time() - started:.1f}s ({workers} worker(s))")
+
+    # 2. Build Profiles (near-duplicate blurbs dropped) & Prepare Corpus for BM25
+    dedup_report = BlurbDedupReport(TokenBudget(EMBED_MAX_TOKENS))
+    bm25_corpus = write_profiles(publishers, PROFILES_FILE, load_terms(fmt, merged_path), dedup_report,
+                                 BOOKS_FILE if book_index_books else None, book_index_books)
+    dedup_report.print_summary()
 
     # 3. Fit and Save BM25
+    if incremental_bm25:
+        update_bm25(bm25_corpus)
+        return
+
     print("Fitting BM25 Encoder to Publisher vocabulary...")
-    bm25 = BM25Encoder()
-    bm25.fit(bm25_corpus)
+    bm25 = FastBM25Encoder()
+    bm25.fit(list(bm25_corpus.values()))
     bm25.dump(BM25_WEIGHTS_FILE)
     print(f"BM25 weights saved to {BM25_WEIGHTS_FILE}")
 
 
+def update_bm25(bm25_corpus):
+    """Incrementally updates the BM25 statistics to `bm25_corpus` ({publisher_id: sparse_text}) and reports moved vectors."""
+    # Without saved statistics we don't know what the indexed vectors were encoded with, so no moved set is
+    # recorded and the next sync builds a fresh index version
+    resumable = os.path.exists(BM25_STATE_FILE) and os.path.exists(BM25_WEIGHTS_FILE)
+    if resumable:
+        model = IncrementalBM25.load(BM25_STATE_FILE)
+        base_weights = file_sha256(BM25_WEIGHTS_FILE)
+    else:
+        print(f"No {BM25_STATE_FILE} yet; building BM25 statistics from scratch.")
+        model = IncrementalBM25()
+
+    changed, removed = model.update_corpus(bm25_corpus)
+    changed_ids = set(changed)
+    moved = [doc_id for doc_id in model.moved_documents(BM25_MOVE_TOLERANCE) if doc_id not in changed_ids]
+    model.mark_encoded(changed + moved)  # The next index sync (re-)upserts all of these
+
+    model.to_encoder().dump(BM25_WEIGHTS_FILE)
+    model.save(BM25_STATE_FILE)
+    if resumable:
+        record_moved_ids(BM25_MOVED_IDS_FILE, base_weights, file_sha256(BM25_WEIGHTS_FILE), moved)
+
+    print(f"BM25 updated: {len(changed):,} added/changed, {len(removed):,} removed, "
+          f"{len(moved):,} unchanged publishers moved beyond {BM25_MOVE_TOLERANCE} (avgdl {model.avgdl:.4f})")
+    print(f"BM25 weights saved to {BM25_WEIGHTS_FILE}")
+
+
 # ==========================================
 # PHASE 5: EMBED & UPSERT TO PINECONE
 # ==========================================
-def embed_and_upsert():
-    # 1. Check if the index exists and delete it if it's the wrong one
-    if PINECONE_INDEX_NAME in pc.list_indexes().names():
-        print(f"Deleting old '{PINECONE_INDEX_NAME}' index...")
-        pc.delete_index(PINECONE_INDEX_NAME)
-
-    # 2. Create the new, correct Hybrid Index
+def create_embeddings(texts):
+    """
+    One embeddings request, retried with exponential backoff and jitter on rate limits (429), server errors
+    and dropped connections, so EMBED_CONCURRENCY requests in flight back off instead of failing the sync.
+    """
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            res = openai_client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+            return [d.embedding for d in res.data]
+        except (RateLimitError, InternalServerError, APIConnectionError) as e:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            delay = EMBED_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"Embeddings request failed ({type(e).__name__}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_dense_texts(texts, cache=None):
+    """Embeds a batch of texts, only sending the ones missing from `cache` to the embeddings API."""
+    if cache is None:
+        return create_embeddings(texts)
+
+    vectors = cache.get_many(texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = create_embeddings([texts[i] for i in missing])
+        cache.put_many([texts[i] for i in missing], fresh)
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+    return vectors
+
+
+def _build_records(batch, dense_vectors, sparse_vectors):
+    """Assembles the Pinecone payloads for a batch of profiles."""
+    upsert_payload = []
+    for idx, p in enumerate(batch):
+        metadata = {
+            "publisher_name": p["publisher_name"],
+            "publication_volume": p["publication_volume"],
+            "avg_goodreads_rating": p["avg_goodreads_rating"],
+            "recent_comp_titles": p["recent_comp_titles"],
+            "active_genres": p["active_genres"]
+        }
+
+        # Base record with ID, Dense Vector, and Metadata
+        record = {
+            "id": p["publisher_id"],
+            "values": dense_vectors[idx],
+            "metadata": metadata
+        }
+
+        # Safely attach the sparse vector ONLY if it contains actual data
+        sv = sparse_vectors[idx]
+        if sv and len(sv.get("indices", [])) > 0:
+            record["sparse_values"] = sv
+
+        upsert_payload.append(record)
+    return upsert_payload
+
+
+def _create_index():
+    # Create the Hybrid Index once; versions of the publisher vectors live in its namespaces
     print(f"Creating new '{PINECONE_INDEX_NAME}' index with dotproduct metric...")
     pc.create_index(
         name=PINECONE_INDEX_NAME,
@@ -228,69 +603,374 @@ def embed_and_upsert():
         )
     )
 
+
+def embed_and_upsert(pipelined=False, full_rebuild=False, activate=False):
+    """
+    Syncs the Pinecone index with PROFILES_FILE. Vectors live in versioned namespaces (see index_versions)
+    and INDEX_ALIAS_FILE says which version serves queries.
+
+    By default the active version is synced incrementally: profiles are diffed against its manifest and only
+    new or changed ones are upserted and removed ones deleted, so the index keeps serving throughout.
+    A new version is built next to the active one instead when full_rebuild is set, when nothing is active yet,
+    or when the embedding settings / BM25 weights changed. It goes live right away only if nothing is active
+    (or with activate); otherwise benchmark it and cut over with scripts/strategist_index.py.
+
+    BM25 sparse vectors are encoded up front across BM25_ENCODE_WORKERS processes. With pipelined, embedding
+    requests are packed by token count and run concurrently, while upserts overlap with them
+    (see _upsert_pipelined); otherwise batches run one after the other.
+    """
+    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+        _create_index()
     index = pc.Index(PINECONE_INDEX_NAME)
-    bm25 = BM25Encoder().load(BM25_WEIGHTS_FILE)
 
     profiles = []
     with open(PROFILES_FILE, 'r', encoding='utf-8') as f:
         profiles = [json.loads(line) for line in f]
 
-    batch_size = 100  # OpenAI and Pinecone sweet spot
+    settings = {
+        "embedding_model": EMBEDDING_MODEL,
+        "embed_max_tokens": EMBED_MAX_TOKENS,
+        "bm25_weights": file_sha256(BM25_WEIGHTS_FILE),
+    }
+    alias = load_alias(INDEX_ALIAS_FILE)
+    version = alias["active"]
+    manifest = load_manifest(manifest_path(version, INDEX_ALIAS_FILE)) if version else None
+
+    # An incremental BM25 update keeps syncing in place: only the vectors it moved are re-upserted
+    moved = load_moved_ids(BM25_MOVED_IDS_FILE)
+    moved_ids = ()
+    if not full_rebuild and manifest is not None and _bm25_update_applies(manifest["settings"], settings, moved):
+        moved_ids = moved["ids"]
+        manifest = dict(manifest, settings=settings)
+        update_version_bm25(alias, version, BM25_WEIGHTS_FILE, INDEX_ALIAS_FILE)
+        print(f"Applying incremental BM25 update: {len(moved_ids):,} moved sparse vectors to re-upsert")
+
+    if full_rebuild or manifest is None or manifest["settings"] != settings:
+        version = _unfinished_version(alias, settings)
+        if version:
+            manifest = load_manifest(manifest_path(version, INDEX_ALIAS_FILE))
+            print(f"Resuming interrupted build of index version '{version}'...")
+        else:
+            version = create_version(alias, BM25_WEIGHTS_FILE, INDEX_ALIAS_FILE)
+            manifest = None
+            print(f"Building new index version '{version}'...")
+    else:
+        print(f"Syncing active index version '{version}'...")
+    namespace = alias["versions"][version]["namespace"]
+    bm25 = FastBM25Encoder().load(bm25_path(alias, version, INDEX_ALIAS_FILE))
+
+    changed, removed, records = diff_profiles(manifest, profiles, settings, moved_ids)
+    print(f"Sync plan: {len(changed):,} to upsert, {len(removed):,} to delete, "
+          f"{len(profiles) - len(changed):,} unchanged")
+    progress = SyncProgress(manifest_path(version, INDEX_ALIAS_FILE), settings, manifest, records, SYNC_CHECKPOINT_EVERY)
+    progress.save()  # Makes a new build resumable from its first checkpoint
+
+    # Sparse vectors are local CPU work: encode them all up front across BM25_ENCODE_WORKERS processes
+    sparse_texts = [p["sparse_text"] for p in changed]
+    sparse_vectors = dict(zip(
+        [p["publisher_id"] for p in changed], bm25.encode_documents_parallel(sparse_texts, BM25_ENCODE_WORKERS),
+    ))
+
+    budget = TokenBudget(EMBED_MAX_TOKENS)
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL, EMBEDDING_CACHE_MAX_BYTES) if EMBEDDING_CACHE_PATH else None
+
+    if pipelined:
+        _upsert_pipelined(index, sparse_vectors, changed, budget, cache, namespace, progress)
+    else:
+        for i in tqdm(range(0, len(changed), UPSERT_BATCH_SIZE), desc="Upserting to Pinecone"):
+            batch = changed[i: i + UPSERT_BATCH_SIZE]
+
+            # 1. Generate Dense Vectors (Batch Call to OpenAI, skipping cached texts)
+            dense_texts = [budget.truncate(p["dense_text"])[0] for p in batch]  # Cut to the model's token limit
+            dense_vectors = embed_dense_texts(dense_texts, cache)
+
+            # 2. Assemble Pinecone Payloads (with the BM25 sparse vectors) & Push to Pinecone
+            batch_sparse = [sparse_vectors[p["publisher_id"]] for p in batch]
+            index.upsert(vectors=_build_records(batch, dense_vectors, batch_sparse), namespace=namespace)
+            progress.mark_upserted([p["publisher_id"] for p in batch])
+
+    # Deletes go last, so a publisher that was renamed is never missing from the index
+    for i in range(0, len(removed), PINECONE_DELETE_BATCH_SIZE):
+        index.delete(ids=removed[i: i + PINECONE_DELETE_BATCH_SIZE], namespace=namespace)
+        progress.mark_deleted(removed[i: i + PINECONE_DELETE_BATCH_SIZE])
+
+    progress.save()
+    if moved and moved["weights"] == settings["bm25_weights"]:
+        os.remove(BM25_MOVED_IDS_FILE)  # Every moved vector is now re-encoded
+    print("All publisher vectors successfully upserted to Pinecone!")
+    if cache is not None:
+        cache.report()  # The sync's hit rate, before the local export reads every profile back through the cache
+    if EXPORT_LOCAL_INDEX and cache is not None:
+        # Exports are rewritten only when what they are built from changed (a no-op resync skips them)
+        synced = records_digest(settings, progress.records)
+        fingerprint = {"manifest": synced}
+        if _export_is_current(progress, "local_index", fingerprint, local_index_path(version, INDEX_ALIAS_FILE)):
+            print(f"Local index for '{version}' is up to date, skipping export")
+        else:
+            export_local_index(profiles, bm25, version, budget, cache)
+            progress.mark_exported("local_index", fingerprint)
+        if EXPORT_BOOK_INDEX:
+            stat = os.stat(BOOKS_FILE)
+            fingerprint = {
+                "manifest": synced,
+                "books": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+                "settings": {"embedding_model": EMBEDDING_MODEL, "embed_max_tokens": EMBED_MAX_TOKENS,
+                             "ann_min_books": BOOK_ANN_MIN_BOOKS},
+            }
+            if _export_is_current(progress, "book_index", fingerprint, book_index_path(version, INDEX_ALIAS_FILE)):
+                print(f"Book index for '{version}' is up to date, skipping export")
+            else:
+                export_book_index(version, budget, alias["active"])
+                progress.mark_exported("book_index", fingerprint)
+    if cache is not None:
+        cache.close()
+
+    if version != alias["active"]:
+        mark_built(alias, version, INDEX_ALIAS_FILE)
+        if activate or alias["active"] is None:
+            cutover(alias, version, INDEX_ALIAS_FILE)
+            print(f"Index version '{version}' is now active.")
+        else:
+            print(f"Index version '{version}' is built; benchmark and cut over with scripts/strategist_index.py.")
+    return version
+
+
+def _export_is_current(progress, name, fingerprint, path):
+    """Whether the export at `path` was last written from `fingerprint` (and is still there)."""
+    return progress.export_is_current(name, fingerprint) and os.path.exists(resolve_index_dir(path))
+
+
+def export_local_index(profiles, bm25, version, budget, cache):
+    """Writes every profile's record, as upserted to the version's namespace, to its local index directory."""
+    texts = [budget.truncate(p["dense_text"])[0] for p in profiles]
+    dense_vectors = []
+    for i in tqdm(range(0, len(texts), EMBED_BATCH_INPUTS), desc="Exporting local index"):
+        dense_vectors.extend(embed_dense_texts(texts[i: i + EMBED_BATCH_INPUTS], cache))
+    sparse_vectors = bm25.encode_documents_parallel([p["sparse_text"] for p in profiles], BM25_ENCODE_WORKERS)
+
+    path = local_index_path(version, INDEX_ALIAS_FILE)
+    write_local_index(path, _build_records(profiles, dense_vectors, sparse_vectors))
+    print(f"Local index for '{version}' written to {path} ({len(profiles):,} publishers)")
+
+
+def export_book_index(version, budget, active_version=None):
+    """
+    Embeds every book in BOOKS_FILE into the version's book index directory, EMBED_BATCH_INPUTS at a time, each
+    batch written straight into the build's memory-mapped dense.npy, so memory stays flat at millions of books.
+    Books whose text is unchanged keep their vector from the version's current book index or the active
+    version's (when embedded with the same settings); only the rest go to the embeddings API. Book vectors
+    never pass through the publisher embedding cache, so they can't evict the vectors export_local_index needs.
+    """
+    settings = {"embedding_model": EMBEDDING_MODEL, "embed_max_tokens": EMBED_MAX_TOKENS}
+    books = []
+    with open(BOOKS_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            book = json.loads(line)
+            books.append({"book_id": book["book_id"], "publisher_id": book["publisher_id"], "title": book["title"]})
+    if not books:
+        print(f"No books in {BOOKS_FILE}; book index not written")
+        return
+
+    previous_rows, previous_vectors = _reusable_book_vectors([version, active_version], settings)
+    path = book_index_path(version, INDEX_ALIAS_FILE)
+    build_path = new_index_dir(path)
+    vectors, n_embedded = None, 0
+    with open(BOOKS_FILE, 'r', encoding='utf-8') as f, tqdm(total=len(books), desc="Exporting book index") as pbar:
+        start = 0
+        while True:
+            batch = [json.loads(line) for line in islice(f, EMBED_BATCH_INPUTS)]
+            if not batch: break
+            rows = [previous_rows.get(b["book_id"]) for b in batch]
+            missing = [i for i, row in enumerate(rows) if row is None]
+            kept = [i for i, row in enumerate(rows) if row is not None]
+            fresh = create_embeddings([budget.truncate(batch[i]["text"])[0] for i in missing]) if missing else []
+
+            if vectors is None:
+                dim = len(fresh[0]) if fresh else previous_vectors.shape[1]
+                vectors = np.lib.format.open_memmap(
+                    build_path / "dense.npy", mode="w+", dtype=np.float32, shape=(len(books), dim),
+                )
+            block = np.empty((len(batch), vectors.shape[1]), dtype=np.float32)
+            if missing:
+                block[missing] = np.asarray(fresh, dtype=np.float32)
+            if kept:
+                block[kept] = previous_vectors[[rows[i] for i in kept]]
+            vectors[start: start + len(batch)] = block
+            start += len(batch)
+            n_embedded += len(missing)
+            pbar.update(len(batch))
+    vectors.flush()
+    del vectors
+
+    finish_book_index(path, build_path, books, BOOK_ANN_MIN_BOOKS, settings)
+    print(f"Book index for '{version}' written to {path} ({len(books):,} books, {n_embedded:,} embedded, "
+          f"{len(books) - n_embedded:,} reused)")
+
+
+def _reusable_book_vectors(versions, settings):
+    """
+    ({book_id: row}, memory-mapped vectors) of the first of `versions` with a book index embedded with `settings`
+    (book ids hash the publisher and the text, so an id names one embedding input); ({}, None) if none has one.
+    """
+    for version in dict.fromkeys(v for v in versions if v):
+        path = resolve_index_dir(book_index_path(version, INDEX_ALIAS_FILE))
+        if not os.path.exists(path / BOOK_INDEX_FILE): continue
+        with open(path / BOOK_INDEX_FILE, 'r', encoding='utf-8') as f:
+            books = json.load(f)
+        if books.get("settings") == settings:
+            return {book_id: row for row, book_id in enumerate(books["ids"])}, np.load(path / "dense.npy", mmap_mode="r")
+    return {}, None
+
+
+def _bm25_update_applies(indexed_settings, settings, moved):
+    """
+    True if the indexed settings differ from `settings` at most by a BM25 update whose moved set is pending
+    (equal settings mean an earlier sync applying it was interrupted).
+    """
+    return (
+        moved is not None
+        and moved["weights"] == settings["bm25_weights"]
+        and indexed_settings in (settings, dict(settings, bm25_weights=moved["base_weights"]))
+    )
+
 
-    for i in tqdm(range(0, len(profiles), batch_size), desc="Upserting to Pinecone"):
-        batch = profiles[i: i + batch_size]
+def _unfinished_version(alias, settings):
+    """A version whose build was interrupted with the same settings, if any; its manifest says how far it got."""
+    for version, entry in alias["versions"].items():
+        manifest = load_manifest(manifest_path(version, INDEX_ALIAS_FILE)) if entry["status"] == "building" else None
+        if manifest and manifest["settings"] == settings:
+            return version
+    return None
+
+
+def _upsert_pipelined(index, sparse_vectors, profiles, budget, cache=None, namespace="", progress=None):
+    """
+    Embedding requests are packed up to EMBED_BATCH_TOKENS / EMBED_BATCH_INPUTS and up to EMBED_CONCURRENCY
+    run at once. As each one returns, the upserts of its profiles (with their precomputed `sparse_vectors`,
+    keyed by publisher id) run on a second pool, overlapping the embedding requests still in flight. The cache is only touched from this thread.
+    """
+    started = time.perf_counter()
+    truncated = [budget.truncate(p["dense_text"]) for p in profiles]
+    texts = [text for text, _ in truncated]
+    dense_vectors = cache.get_many(texts) if cache is not None else [None] * len(texts)
+
+    cached = [i for i, v in enumerate(dense_vectors) if v is not None]
+    missing = [i for i, v in enumerate(dense_vectors) if v is None]
+    requests = [
+        [missing[j] for j in group]
+        for group in pack_by_tokens([truncated[i][1] for i in missing], EMBED_BATCH_TOKENS, EMBED_BATCH_INPUTS)
+    ]
+
+    def embed(ids):
+        return ids, create_embeddings([texts[i] for i in ids])
+
+    def upsert(ids):
+        batch = [profiles[i] for i in ids]
+        batch_sparse = [sparse_vectors[p["publisher_id"]] for p in batch]
+        index.upsert(vectors=_build_records(batch, [dense_vectors[i] for i in ids], batch_sparse), namespace=namespace)
+        if progress is not None:
+            progress.mark_upserted([p["publisher_id"] for p in batch])
+        return len(ids)
+
+    with tqdm(total=len(profiles), desc="Upserting to Pinecone (pipelined)") as pbar, \
+            ThreadPoolExecutor(EMBED_CONCURRENCY) as embed_pool, ThreadPoolExecutor(UPSERT_CONCURRENCY) as upsert_pool:
+
+        upserts = []
+
+        def report_upsert(future):
+            if future.exception() is None:
+                pbar.update(future.result())
+
+        def submit_upserts(ids):
+            for k in range(0, len(ids), UPSERT_BATCH_SIZE):
+                future = upsert_pool.submit(upsert, ids[k: k + UPSERT_BATCH_SIZE])
+                future.add_done_callback(report_upsert)
+                upserts.append(future)
+
+        embeds = [embed_pool.submit(embed, ids) for ids in requests]
+        submit_upserts(cached)  # Cached profiles need no API call
+
+        for future in as_completed(embeds):
+            ids, vectors = future.result()
+            for i, vector in zip(ids, vectors):
+                dense_vectors[i] = vector
+            if cache is not None:
+                cache.put_many([texts[i] for i in ids], vectors)
+            submit_upserts(ids)
+
+        for future in as_completed(upserts):
+            future.result()  # Surface upsert errors
+
+    elapsed = time.perf_counter() - started
+    print(f"Embedded {len(missing):,} profiles in {len(requests):,} requests "
+          f"({sum(truncated[i][1] for i in missing):,} tokens); {len(profiles) / max(elapsed, 1e-9):,.0f} profiles/sec")
 
-        # 1. Generate Dense Vectors (Batch Call to OpenAI)
-        dense_texts = [p["dense_text"][:8000] for p in batch]  # Truncate just in case to avoid token limits
-        res = openai_client.embeddings.create(input=dense_texts, model=EMBEDDING_MODEL)
-        dense_vectors = [d.embedding for d in res.data]
 
-        # 2. Generate Sparse Vectors (Local BM25)
-        sparse_vectors = bm25.encode_documents([p["sparse_text"] for p in batch])
+# ==========================================
+# PIPELINE RUNNER
+# ==========================================
+def _restart_table(conn, table):
+    """
+    Phases rerun from scratch, so a table left half-filled by a crashed run (or created with an older schema)
+    is recreated empty, as a bulk-load staging table.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(f"CREATE TABLE {table} ({TABLE_COLUMNS[table].format(pk='')})")
+    conn.commit()
 
-        # 3. Assemble Pinecone Payloads
-        upsert_payload = []
-        for idx, p in enumerate(batch):
-            metadata = {
-                "publisher_name": p["publisher_name"],
-                "publication_volume": p["publication_volume"],
-                "avg_goodreads_rating": p["avg_goodreads_rating"],
-                "recent_comp_titles": p["recent_comp_titles"],
-                "active_genres": p["active_genres"]
-            }
 
-            # Base record with ID, Dense Vector, and Metadata
-            record = {
-                "id": p["publisher_id"],
-                "values": dense_vectors[idx],
-                "metadata": metadata
-            }
+def _run_goodreads_phase():
+    conn = setup_database(bulk_load=True)
+    _restart_table(conn, "goodreads")
+    process_goodreads(conn, workers=INGEST_WORKERS, build_isbn_filter=True)
+    conn.close()
 
-            # Safely attach the sparse vector ONLY if it contains actual data
-            sv = sparse_vectors[idx]
-            if sv and len(sv.get("indices", [])) > 0:
-                record["sparse_values"] = sv
 
-            upsert_payload.append(record)
+def _run_openlibrary_phase():
+    conn = setup_database(bulk_load=True)
+    _restart_table(conn, "openlibrary")
+    process_openlibrary(conn, workers=INGEST_WORKERS, use_isbn_filter=True)
+    conn.close()
 
-        # 4. Push to Pinecone
-        index.upsert(vectors=upsert_payload)
 
-    print("All publisher vectors successfully upserted to Pinecone!")
+def _run_finalize_phase():
+    conn = setup_database(bulk_load=True)
+    finalize_bulk_load(conn)
+    conn.close()
+
+
+def _run_export_phase():
+    conn = setup_database()
+    export_joined_data(conn, fmt=MERGED_FORMAT)
+    conn.close()
+
+
+def pipeline_phases():
+    merged_path = MERGED_PARQUET_FILE if MERGED_FORMAT == "parquet" else MERGED_FILE
+    merged_outputs = [merged_path, terms_path(merged_path)] if MERGED_FORMAT == "parquet" else [merged_path]
+    return [
+        Phase("goodreads", _run_goodreads_phase, inputs=[GOODREADS_FILE], outputs=[ISBN_FILTER_FILE], requires=[DB_PATH]),
+        Phase("openlibrary", _run_openlibrary_phase, inputs=[OPENLIBRARY_FILE, ISBN_FILTER_FILE], requires=[DB_PATH]),
+        Phase("finalize", _run_finalize_phase, requires=[DB_PATH]),
+        Phase("export", _run_export_phase, outputs=merged_outputs, requires=[DB_PATH]),
+        Phase("aggregate", lambda: aggregate_and_fit_bm25(
+            fmt=MERGED_FORMAT, workers=INGEST_WORKERS, heavy_hitters=HEAVY_HITTERS_CAPACITY,
+            incremental_bm25=True, book_index_books=BOOK_INDEX_BOOKS if EXPORT_BOOK_INDEX else 0,
+        ), inputs=merged_outputs, outputs=[PROFILES_FILE, BM25_WEIGHTS_FILE] + ([BOOKS_FILE] if EXPORT_BOOK_INDEX else [])),
+        Phase("embed", lambda: embed_and_upsert(pipelined=True),
+              inputs=[PROFILES_FILE, BM25_WEIGHTS_FILE] + ([BOOKS_FILE] if EXPORT_BOOK_INDEX else [])),
+    ]
 
 
 # ==========================================
 # EXECUTION
 # ==========================================
 if __name__ == "__main__":
-    # Feel free to comment out phases you have already run!
-
-    # conn = setup_database()
-    # process_goodreads(conn)
-    # process_openlibrary(conn)
-    # export_joined_data(conn)
-    # conn.close()
-
-    # aggregate_and_fit_bm25()
-
-    embed_and_upsert()
+    # Completed phases are skipped on re-run (see PIPELINE_CHECKPOINT_FILE); a crashed embed resumes mid-phase
+    parser = argparse.ArgumentParser(description="SlushPilot preprocessing pipeline")
+    parser.add_argument("--from", dest="start", metavar="PHASE", help="Rerun from this phase onwards")
+    parser.add_argument("--only", metavar="PHASE", help="Rerun a single phase (later phases rerun on the next run)")
+    parser.add_argument("--force", action="store_true", help="Ignore existing checkpoints")
+    args = parser.parse_args()
+
+    run_phases(pipeline_phases(), PipelineCheckpoint(PIPELINE_CHECKPOINT_FILE), args.start, args.only, args.force)
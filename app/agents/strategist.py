@@ -1,7 +1,11 @@
 import json
-from dataclasses import dataclass
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from openai import OpenAI
 from pinecone import Pinecone
@@ -15,6 +19,11 @@ from app.schemas.strategist import (
     RerankedList,
     StrategistManuscript,
 )
+from app.services.bm25 import binary_path_for, load_bm25
+from app.services.book_index import BOOKS_FILE, BookIndex, book_index_path
+from app.services.local_index import RECORDS_FILE, LocalHybridIndex, local_index_path, resolve_index_dir
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -24,22 +33,64 @@ class StrategistService:
     bm25: BM25Encoder
     chat_model: str
     embed_model: str
+    namespace: str = ""
+    index_version: Optional[str] = None
+
+
+def resolve_index_version(version: Optional[str] = None) -> tuple:
+    """
+    Returns (version, namespace, BM25 weights path) for `version`, or for the alias's active version.
+    Without an alias file (or an active version) the default namespace and STRATEGIST_BM25_PATH are used.
+    """
+    alias_path = Path(config.STRATEGIST_INDEX_ALIAS_PATH)
+    alias = json.loads(alias_path.read_text(encoding="utf-8")) if alias_path.exists() else {}
+    version = version or alias.get("active")
+    if not version:
+        return None, "", Path(config.STRATEGIST_BM25_PATH)
+
+    entry = alias.get("versions", {}).get(version)
+    if entry is None:
+        raise ValueError(f"Unknown Strategist index version: {version}")
+    return version, entry["namespace"], alias_path.parent / entry["bm25_path"]
 
 
-def create_strategist_service() -> StrategistService:
+def _in_process() -> bool:
+    """Whether queries are answered from the version's local exports rather than Pinecone."""
+    return config.STRATEGIST_BACKEND == "local" or config.STRATEGIST_RETRIEVAL == "books"
+
+
+def _open_index(bm25_path: Path):
+    """
+    The retrieval backend: the Pinecone index, the local copy of the version using these BM25 weights, or
+    its book index pooled into publishers (with the local copy's BM25 scores and metadata).
+    """
+    if not _in_process():
+        return Pinecone(api_key=config.PINECONE_API_KEY).Index(config.PINECONE_INDEX)
+    publishers = LocalHybridIndex.load(
+        local_index_path(bm25_path), config.STRATEGIST_DENSE_QUANTIZATION, config.STRATEGIST_RESCORE_CANDIDATES,
+    )
+    if config.STRATEGIST_RETRIEVAL == "books":
+        return BookIndex.load(
+            book_index_path(bm25_path), publishers, config.STRATEGIST_BOOK_POOLING,
+            config.STRATEGIST_DENSE_QUANTIZATION, config.STRATEGIST_RESCORE_CANDIDATES,
+        )
+    return publishers
+
+
+def create_strategist_service(version: Optional[str] = None) -> StrategistService:
     if not config.OPENAI_API_KEY:
         raise ValueError("Missing OPENAI_API_KEY")
-    if not config.PINECONE_API_KEY:
+    if not _in_process() and not config.PINECONE_API_KEY:
         raise ValueError("Missing PINECONE_API_KEY")
+    if config.STRATEGIST_BACKEND not in ("pinecone", "local"):
+        raise ValueError(f"Unknown STRATEGIST_BACKEND: {config.STRATEGIST_BACKEND}")
+    if config.STRATEGIST_RETRIEVAL not in ("publishers", "books"):
+        raise ValueError(f"Unknown STRATEGIST_RETRIEVAL: {config.STRATEGIST_RETRIEVAL}")
 
     client = OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.BASE_URL)
-    pinecone_client = Pinecone(api_key=config.PINECONE_API_KEY)
-    index = pinecone_client.Index(config.PINECONE_INDEX)
-
-    bm25_path = Path(config.STRATEGIST_BM25_PATH)
-    if not bm25_path.exists():
-        raise FileNotFoundError(f"Missing BM25 weights: {bm25_path}")
-    bm25 = BM25Encoder().load(str(bm25_path))
+    index_version, namespace, bm25_path = resolve_index_version(version)
+    index = _open_index(bm25_path)
+    bm25 = load_bm25(bm25_path)  # Memory-mapped binary weights when converted (scripts/convert_bm25.py)
 
     return StrategistService(
         client=client,
@@ -47,9 +98,109 @@ def create_strategist_service() -> StrategistService:
         bm25=bm25,
         chat_model=config.CHAT_MODEL,
         embed_model=config.EMBED_MODEL,
+        namespace=namespace,
+        index_version=index_version,
     )
 
 
+# Process-wide service shared by all requests (see get_strategist_service)
+_service: Optional[StrategistService] = None
+_service_key: Optional[tuple] = None
+_service_lock = threading.Lock()
+_readiness = {"status": "not_started", "error": None, "index_version": None, "warmup_seconds": None}
+
+
+def _mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _index_key() -> tuple:
+    """What a loaded service depends on: the active index version, its BM25 weights and local indexes on disk."""
+    version, namespace, bm25_path = resolve_index_version()
+    local = _mtime_ns(resolve_index_dir(local_index_path(bm25_path)) / RECORDS_FILE) if _in_process() else None
+    books = _mtime_ns(resolve_index_dir(book_index_path(bm25_path)) / BOOKS_FILE) \
+        if config.STRATEGIST_RETRIEVAL == "books" else None
+    return (
+        version, namespace, str(bm25_path), _mtime_ns(bm25_path), _mtime_ns(binary_path_for(bm25_path)), local, books,
+    )
+
+
+def get_strategist_service() -> StrategistService:
+    """
+    The shared StrategistService, created on first use (or by warm_up_strategist_service at startup).
+    Its OpenAI / Pinecone clients live as long as the process; when the alias switches versions or the
+    active version's BM25 weights (or its local index) change on disk, they are swapped in on the next call.
+    If the alias or the new version can't be read, the last good service keeps serving.
+    """
+    global _service, _service_key
+    service = _service
+    try:
+        key = _index_key()
+    except Exception:
+        if service is None:
+            raise
+        logger.exception("Could not read the Strategist index alias; serving index version %s", service.index_version)
+        return service
+    if service is not None and key == _service_key:
+        return service
+
+    with _service_lock:
+        if _service is None:
+            _service = create_strategist_service()
+        elif key != _service_key:
+            try:
+                version, namespace, bm25_path = resolve_index_version()
+                index = _open_index(bm25_path) if _in_process() else _service.index
+                bm25 = load_bm25(bm25_path)
+            except Exception:
+                # Not retried until the files change again
+                logger.exception("Could not reload the Strategist index; serving index version %s",
+                                 _service.index_version)
+                _service_key = key
+                return _service
+            # A new object, so requests already holding the old one finish with consistent weights
+            _service = replace(_service, index=index, bm25=bm25, namespace=namespace, index_version=version)
+        _service_key = key
+        if _readiness["status"] != "warming_up":
+            _readiness.update(status="ready", error=None)  # A failed warm-up no longer applies
+        return _service
+
+
+def warm_up_strategist_service() -> dict:
+    """
+    Builds the shared service and exercises it once (NLTK tokenizer data, BM25 weights, the Pinecone
+    connection), so the first request doesn't pay for it. Returns the readiness state. After a failure the
+    service is dropped, and the next request creating it successfully marks the Strategist ready.
+    """
+    global _service, _service_key
+    started = time.perf_counter()
+    _readiness.update(status="warming_up", error=None)
+    try:
+        service = get_strategist_service()
+        service.bm25.encode_queries("literary fiction")
+        service.index.describe_index_stats()
+    except Exception as exc:
+        with _service_lock:
+            _service, _service_key = None, None
+            _readiness.update(status="error", error=str(exc))
+        raise
+    _readiness.update(
+        status="ready", index_version=service.index_version,
+        warmup_seconds=round(time.perf_counter() - started, 3),
+    )
+    return strategist_readiness()
+
+
+def strategist_readiness() -> dict:
+    state = dict(_readiness)
+    if _service is not None:
+        state["index_version"] = _service.index_version
+    return state
+
+
 def formulate_queries(
     service: StrategistService,
     manuscript: StrategistManuscript,
@@ -93,10 +244,18 @@ def retrieve_candidates(
 
     sparse_string = " ".join(queries.lexical_keywords)
     sparse_vec = service.bm25.encode_queries(sparse_string)
+    return query_index(service, dense_vec, sparse_vec, top_k=top_k)
 
+
+def query_index(
+    service: StrategistService, dense_vec: list, sparse_vec: dict, top_k: int = 50
+) -> list:
     if not sparse_vec or len(sparse_vec.get("indices", [])) == 0:
         return service.index.query(
-            vector=dense_vec, top_k=top_k, include_metadata=True
+            vector=dense_vec,
+            top_k=top_k,
+            include_metadata=True,
+            namespace=service.namespace,
         ).matches
 
     dense_scaled, sparse_scaled = hybrid_convex_scale(
@@ -107,6 +266,7 @@ def retrieve_candidates(
         sparse_vector=sparse_scaled,
         top_k=top_k,
         include_metadata=True,
+        namespace=service.namespace,
     )
     return results.matches
 
@@ -129,6 +289,8 @@ def rerank_publishers(
                 "avg_goodreads_rating": meta.get("avg_goodreads_rating"),
             }
         )
+        if meta.get("evidence_books"):  # Book-level retrieval: the titles that matched the manuscript
+            clean_candidates[-1]["matching_books"] = [b["title"] for b in meta["evidence_books"]]
 
     system_text = (
         "You are a master publishing strategist. Identify the absolute best "
@@ -145,6 +307,11 @@ def rerank_publishers(
         "Score each publisher from 1 to 10 based strictly on how well their genres "
         "and recent comp titles align with the manuscript."
     )
+    if any("matching_books" in c for c in clean_candidates):
+        prompt += (
+            " Where listed, matching_books are the publisher's own titles closest to "
+            "the manuscript; weigh them as evidence of fit."
+        )
 
     response = service.client.beta.chat.completions.parse(
         model=service.chat_model,
@@ -14,8 +14,8 @@ from app.agents.composer import compose_query_letters
 from app.agents.intake import parse_intake
 from app.agents.strategist import (
     StrategistManuscript,
-    create_strategist_service,
     execute_strategist_pipeline,
+    get_strategist_service,
 )
 from app.schemas.composer import (
     ComposerOptions,
@@ -213,7 +213,7 @@ def _supervisor_node(state: QueryLetterState) -> dict:
 def _strategist_node(state: QueryLetterState) -> dict:
     strategist_data = state.get("strategist_data") or {}
     strategist_input = StrategistManuscript(**strategist_data)
-    service = create_strategist_service()
+    service = get_strategist_service()
     results = execute_strategist_pipeline(service, strategist_input)
     publishers = [
         Publisher(name=entry.publisher_name or entry.publisher_id, comps=entry.comps)
@@ -1,12 +1,36 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.agents.strategist import warm_up_strategist_service
 from app.routers import chat as chat_router
 from app.routers import composer as composer_router
 from app.routers import core as core_router
 
+logger = logging.getLogger(__name__)
+
+
+async def _warm_up_strategist() -> None:
+    try:
+        state = await asyncio.to_thread(warm_up_strategist_service)
+        logger.info("Strategist service ready in %.2fs (index version %s)",
+                    state["warmup_seconds"], state["index_version"])
+    except Exception:
+        logger.exception("Strategist warm-up failed; the service will be created on first use")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up runs in the background so the server starts accepting requests; /api/health reports when it's done
+    warm_up = asyncio.create_task(_warm_up_strategist())
+    yield
+    warm_up.cancel()
+
 
-app = FastAPI(title="Slush Pilot")
+app = FastAPI(title="Slush Pilot", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -2,7 +2,7 @@ import logging
 import time
 
 from fastapi import APIRouter
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 
 import config
 from app.agents.clarify import generate_clarification
@@ -11,10 +11,11 @@ from app.services.supabase_client import get_supabase_client
 from app.agents.intake import parse_intake
 from app.agents.strategist import (
     StrategistManuscript,
-    create_strategist_service,
     formulate_queries,
+    get_strategist_service,
     rerank_publishers,
     retrieve_candidates,
+    strategist_readiness,
 )
 from app.schemas.composer import (
     ComposerOptions,
@@ -30,6 +31,17 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+@router.get("/api/health")
+async def get_health() -> JSONResponse:
+    """Readiness: 200 once the shared Strategist service has warmed up, 503 before (or if warm-up failed)."""
+    strategist = strategist_readiness()
+    ready = strategist["status"] == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "strategist": strategist},
+    )
+
+
 @router.get("/api/team_info", response_model=TeamInfoResponse)
 async def get_team_info() -> TeamInfoResponse:
     batch_order_number = "3_4"
@@ -500,7 +512,7 @@ async def execute_agent(payload: ExecuteRequest) -> ExecuteResponse:
 
         # ── 2. STRATEGIST - QUERY FORMULATION ──
         t1 = time.time()
-        service = create_strategist_service()
+        service = get_strategist_service()
         manuscript = StrategistManuscript(**strategist_data)
         queries, qf_trace = formulate_queries(service, manuscript, return_trace=True)
         logger.info("Execute: query formulation completed in %.1fs", time.time() - t1)
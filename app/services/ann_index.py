@@ -0,0 +1,245 @@
+"""IVF-PQ approximate nearest-neighbour index (inner product) for book-scale vector search, in NumPy.
+
+Vectors are assigned to the nearest of `nlist` coarse centroids (spherical k-means) and the residual to that
+centroid is product-quantized: split into `m` sub-vectors, each stored as the uint8 id of one of 256 learned
+sub-centroids. A query scores only the lists of its `nprobe` best centroids, with one m x 256 lookup table:
+    q . x  ~=  q . centroid[list]  +  sum_j  q_j . codebook_j[code_j]
+Optionally the best `rerank` candidates are rescored exactly against the stored float vectors.
+
+Recall / latency knobs: nlist and m at build time, nprobe and rerank per query.
+
+On disk (a directory):
+    index.json                          dim, nlist, m, store_vectors, segment names
+    centroids.npy, codebooks.npy        the trained quantizers
+    segments/<name>/codes.npy           uint8[n, m]
+    segments/<name>/lists.npy           int32[n]      coarse list of each vector
+    segments/<name>/ids.json            external ids
+    segments/<name>/vectors.npy         float32[n, dim] (when store_vectors, for reranking)
+Inserts are appended as new segments, each with its own inverted lists, so `add` costs O(inserted rows) and
+saving after `add` only writes the new segments. Saving anywhere else (another directory, or over an index with
+other quantizers) writes everything and clears the stale segments there.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.services.embedding_store import top_positions
+
+PQ_CENTROIDS = 256  # Sub-centroids per sub-space (codes are uint8)
+TRAIN_SAMPLE = 100_000  # Vectors sampled to train the coarse quantizer
+PQ_TRAIN_SAMPLE = 64 * PQ_CENTROIDS  # Residuals sampled to train each PQ codebook
+KMEANS_ITERATIONS = 20
+_CHUNK = 16384  # Rows per batched distance computation
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _kmeans(x: np.ndarray, k: int, iterations: int, rng: np.random.Generator, spherical: bool) -> np.ndarray:
+    """Lloyd's k-means; spherical keeps centroids unit-length and assigns by inner product."""
+    centroids = x[rng.choice(len(x), size=k, replace=len(x) < k)].copy()
+    for _ in range(iterations):
+        assign = _nearest(x, centroids, spherical)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[~empty]
+        centroids[~empty] = np.add.reduceat(x[order], starts, axis=0) / counts[~empty, None]
+        centroids[empty] = x[rng.choice(len(x), size=int(empty.sum()))]  # Re-seed empty clusters
+        if spherical:
+            centroids = _normalize(centroids)
+    return centroids
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray, spherical: bool) -> np.ndarray:
+    """Index of the best centroid for each row: max inner product (spherical) or min L2 distance."""
+    out = np.empty(len(x), dtype=np.int32)
+    sq_norms = None if spherical else (centroids ** 2).sum(axis=1)
+    for start in range(0, len(x), _CHUNK):
+        sims = x[start: start + _CHUNK] @ centroids.T
+        out[start: start + _CHUNK] = sims.argmax(axis=1) if spherical else (sq_norms - 2 * sims).argmin(axis=1)
+    return out
+
+
+class _Segment:
+    """One batch of added vectors, with inverted lists over its own rows built on first search."""
+
+    def __init__(self, name: str, start: int, codes: np.ndarray, lists: np.ndarray, ids: List[str],
+                 vectors: Optional[np.ndarray]):
+        self.name, self.start = name, start  # `start`: position of its first row in IVFPQIndex.ids
+        self.codes, self.lists, self.ids, self.vectors = codes, lists, ids, vectors
+        self._order = self._offsets = None
+
+    def inverted_lists(self, nlist: int):
+        if self._order is None:
+            self._order = np.argsort(self.lists, kind="stable")
+            self._offsets = np.concatenate(([0], np.cumsum(np.bincount(self.lists, minlength=nlist))))
+        return self._order, self._offsets
+
+
+class IVFPQIndex:
+    def __init__(self, centroids: np.ndarray, codebooks: np.ndarray, store_vectors: bool = True):
+        self.centroids = centroids.astype(np.float32)
+        self.codebooks = codebooks.astype(np.float32)  # (m, PQ_CENTROIDS, dim // m)
+        self.store_vectors = store_vectors
+        self.dim = self.centroids.shape[1]
+        self.nlist, self.m = len(self.centroids), len(self.codebooks)
+
+        self.ids: List[str] = []
+        self._segments: List[_Segment] = []
+        self._saved_path: Optional[Path] = None  # Directory these quantizers were last saved to
+        self._saved_segments = set()  # Names of the segments already written there
+
+    # ------------------------------------------
+    # Building
+    # ------------------------------------------
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int = 1024, m: int = 64, store_vectors: bool = True,
+              sample: int = TRAIN_SAMPLE, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> "IVFPQIndex":
+        """Learns the coarse centroids and PQ codebooks from (a sample of) `vectors`. Add vectors with `add`."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1]
+        if dim % m:
+            raise ValueError(f"Dimension {dim} is not divisible by m={m}")
+        rng = np.random.default_rng(seed)
+        train = vectors[rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)]
+
+        centroids = _kmeans(train, nlist, iterations, rng, spherical=True)
+        residuals = train - centroids[_nearest(train, centroids, spherical=True)]
+        residuals = residuals[rng.choice(len(residuals), size=min(PQ_TRAIN_SAMPLE, len(residuals)), replace=False)]
+        sub = dim // m
+        codebooks = np.stack([
+            _kmeans(residuals[:, j * sub: (j + 1) * sub], PQ_CENTROIDS, iterations, rng, spherical=False)
+            for j in range(m)
+        ])
+        return cls(centroids, codebooks, store_vectors)
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Coarse lists and PQ codes, a chunk of rows at a time (`vectors` may be a memory map larger than RAM)."""
+        lists = np.empty(len(vectors), dtype=np.int32)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        sub = self.dim // self.m
+        for start in range(0, len(vectors), _CHUNK):
+            chunk = np.asarray(vectors[start: start + _CHUNK], dtype=np.float32)
+            lists[start: start + len(chunk)] = _nearest(chunk, self.centroids, spherical=True)
+            residuals = chunk - self.centroids[lists[start: start + len(chunk)]]
+            for j in range(self.m):
+                codes[start: start + len(chunk), j] = _nearest(
+                    residuals[:, j * sub: (j + 1) * sub], self.codebooks[j], spherical=False,
+                )
+        return codes, lists
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Inserts vectors; they are searchable right away and written as a new segment by the next `save`."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors have different lengths")
+        codes, lists = self._encode(vectors)
+        self._append(f"{len(self._segments):06d}", codes, lists, list(ids), vectors if self.store_vectors else None)
+
+    def _append(self, name, codes, lists, ids, vectors):
+        self._segments.append(_Segment(name, len(self.ids), codes, lists, ids, vectors))
+        self.ids.extend(ids)
+
+    # ------------------------------------------
+    # Search
+    # ------------------------------------------
+    def search(self, query: Sequence[float], k: int = 10, nprobe: int = 16,
+               rerank: int = 0) -> Tuple[List[str], np.ndarray]:
+        """Approximate top-k by inner product. Returns (ids, scores), best first."""
+        query = np.asarray(query, dtype=np.float32)
+        coarse = self.centroids @ query
+        probe = np.argpartition(-coarse, min(nprobe, self.nlist) - 1)[:nprobe]
+        sub = self.dim // self.m
+        tables = np.einsum("jkd,jd->jk", self.codebooks, query.reshape(self.m, sub))  # (m, 256)
+
+        found = []  # (segment, its rows, their scores)
+        for segment in self._segments:
+            order, offsets = segment.inverted_lists(self.nlist)
+            rows = np.concatenate([order[offsets[l]: offsets[l + 1]] for l in probe])
+            if len(rows):
+                codes = segment.codes[rows]
+                scores = coarse[segment.lists[rows]] + tables[np.arange(self.m), codes].sum(axis=1)
+                found.append((segment, rows, scores))
+        if not found:
+            return [], np.empty(0, dtype=np.float32)
+        owners = np.concatenate([np.full(len(rows), i) for i, (_, rows, _) in enumerate(found)])
+        rows = np.concatenate([rows for _, rows, _ in found])
+        scores = np.concatenate([scores for _, _, scores in found])
+
+        if rerank and self.store_vectors:
+            keep = top_positions(scores, rerank)
+            owners, rows = owners[keep], rows[keep]
+            scores = np.empty(len(keep), dtype=np.float32)
+            for i in np.unique(owners).tolist():
+                mine = owners == i
+                scores[mine] = found[i][0].vectors[rows[mine]] @ query
+        top = top_positions(scores, k)
+        return [self.ids[found[i][0].start + r] for i, r in zip(owners[top].tolist(), rows[top].tolist())], scores[top]
+
+    # ------------------------------------------
+    # Persistence
+    # ------------------------------------------
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Writes the index; index.json goes last. Saving again to the same directory only writes the segments
+        added since. Anywhere else, everything is written and segments not in this index are removed.
+        """
+        path = Path(path)
+        full = self._saved_path is None or path.resolve() != self._saved_path
+        if full:
+            if (path / "index.json").exists():
+                os.remove(path / "index.json")  # The directory holds no valid index until the rewrite is done
+            shutil.rmtree(path / "segments", ignore_errors=True)
+            self._saved_segments = set()
+            (path / "segments").mkdir(parents=True)
+            np.save(path / "centroids.npy", self.centroids)
+            np.save(path / "codebooks.npy", self.codebooks)
+
+        for segment in self._segments:
+            if segment.name in self._saved_segments: continue
+            seg_dir = path / "segments" / segment.name
+            seg_dir.mkdir(exist_ok=True)
+            np.save(seg_dir / "codes.npy", segment.codes)
+            np.save(seg_dir / "lists.npy", segment.lists)
+            if segment.vectors is not None:
+                np.save(seg_dir / "vectors.npy", segment.vectors)
+            with open(seg_dir / "ids.json", "w", encoding="utf-8") as f:
+                json.dump(segment.ids, f)
+            self._saved_segments.add(segment.name)
+
+        header = {
+            "dim": self.dim, "nlist": self.nlist, "m": self.m, "store_vectors": self.store_vectors,
+            "segments": [segment.name for segment in self._segments],
+        }
+        tmp_path = path / "index.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=2)
+        os.replace(tmp_path, path / "index.json")
+        self._saved_path = path.resolve()
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "IVFPQIndex":
+        path = Path(path)
+        with open(path / "index.json", "r", encoding="utf-8") as f:
+            header = json.load(f)
+        index = cls(np.load(path / "centroids.npy"), np.load(path / "codebooks.npy"), header["store_vectors"])
+        for name in header["segments"]:  # Segments a crashed save left out of index.json are ignored
+            seg_dir = path / "segments" / name
+            with open(seg_dir / "ids.json", "r", encoding="utf-8") as f:
+                ids = json.load(f)
+            codes, lists = np.load(seg_dir / "codes.npy"), np.load(seg_dir / "lists.npy")
+            vectors = np.load(seg_dir / "vectors.npy") if index.store_vectors else None
+            index._append(name, codes, lists, ids, vectors)
+        index._saved_path, index._saved_segments = path.resolve(), set(header["segments"])
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
@@ -0,0 +1,335 @@
+"""Compact binary BM25 model format, memory-mapped on load.
+
+Layout (little-endian):
+    8 bytes   magic b"BM25BIN1"
+    uint32    header length, then the JSON header (avgdl, n_docs, b, k1, tokenizer settings, n_terms, and the
+              size / mtime_ns of the JSON weights it was converted from), zero-padded to an 8-byte boundary
+    uint32[n_terms]   term hashes, sorted ascending (zero-padded to 8 bytes)
+    float64[n_terms]  document frequency of each hash
+
+Loading parses the small header and maps the two arrays read-only, so every uvicorn worker shares the same
+page-cache pages instead of holding its own parsed copy of the JSON weights. Converting from the
+pinecone_text JSON params is lossless (JSON numbers are float64).
+
+FastBM25Encoder is a drop-in BM25Encoder with cached per-word token hashes and vectorized TF / IDF maths,
+plus a batch API that fans documents out across processes; its sparse vectors are bit-identical.
+"""
+import json
+import multiprocessing
+import os
+import struct
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from nltk import word_tokenize
+from pinecone_text.sparse import BM25Encoder
+
+MAGIC = b"BM25BIN1"
+_TOKENIZER_KEYS = ("b", "k1", "lower_case", "remove_punctuation", "remove_stopwords", "stem", "language")
+_mapped: Dict[Tuple[str, int], "ArrayBM25Encoder"] = {}
+TOKEN_CACHE_SIZE = 500_000  # Distinct raw words whose hash (or None if filtered out) is remembered
+_FILTERED = object()
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+class DocFreqArrays:
+    """Read-only mapping view of the sorted hash / DF arrays, so BM25Encoder code can keep calling .get()."""
+
+    def __init__(self, indices: np.ndarray, values: np.ndarray):
+        self.indices = indices
+        self.values = values
+
+    def _position(self, idx: int) -> int:
+        pos = int(np.searchsorted(self.indices, idx))
+        return pos if pos < len(self.indices) and self.indices[pos] == idx else -1
+
+    def get(self, idx: int, default=None):
+        pos = self._position(idx)
+        return float(self.values[pos]) if pos >= 0 else default
+
+    def __getitem__(self, idx: int) -> float:
+        pos = self._position(idx)
+        if pos < 0:
+            raise KeyError(idx)
+        return float(self.values[pos])
+
+    def __contains__(self, idx: int) -> bool:
+        return self._position(idx) >= 0
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(i) for i in self.indices)
+
+    def items(self) -> Iterator[Tuple[int, float]]:
+        return zip(self, (float(v) for v in self.values))
+
+
+class FastBM25Encoder(BM25Encoder):
+    """
+    BM25Encoder with the same tokenization and hashing, computed faster:
+    - after word_tokenize, each raw word maps to its hash (lower-casing, punctuation / stopword filtering,
+      stemming and mmh3 are all per-word), so those steps run once per distinct word instead of per token;
+    - document values for a whole batch are computed with one set of array operations;
+    - query DFs are looked up with searchsorted over sorted arrays instead of one dict probe per term.
+    The arithmetic matches BM25Encoder operation for operation, so vectors are bit-identical.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._token_cache: Dict[str, Optional[int]] = {}
+        self._df_source = None
+        self._df_arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def set_params(self, **params) -> "FastBM25Encoder":
+        super().set_params(**params)
+        self._token_cache = {}  # The tokenizer settings may have changed
+        return self
+
+    @classmethod
+    def from_encoder(cls, encoder: BM25Encoder) -> "FastBM25Encoder":
+        """Wraps a fitted BM25Encoder's parameters (sharing its doc_freq)."""
+        fast = cls(b=encoder.b, k1=encoder.k1, **_tokenizer_settings(encoder))
+        fast.avgdl, fast.n_docs, fast.doc_freq = encoder.avgdl, encoder.n_docs, encoder.doc_freq
+        return fast
+
+    # ------------------------------------------
+    # Tokenization
+    # ------------------------------------------
+    def _word_hash(self, word: str) -> Optional[int]:
+        """BM25Tokenizer's per-word steps and the mmh3 hash for one word; None if the word is dropped."""
+        tokenizer = self._tokenizer
+        if tokenizer.lower_case:
+            word = word.lower()
+        if tokenizer.remove_punctuation and word in tokenizer._punctuation:
+            return None
+        if tokenizer.remove_stopwords:
+            if (word if tokenizer.lower_case else word.lower()) in tokenizer._stop_words:
+                return None
+        if tokenizer.stem:
+            word = tokenizer._stemmer.stem(word)
+        return self._hash_text(word)
+
+    def _tf(self, text: str) -> Tuple[List[int], List[int]]:
+        cache = self._token_cache
+        if len(cache) > TOKEN_CACHE_SIZE:
+            cache.clear()
+        hashes = []
+        for word in word_tokenize(text, self._tokenizer.language):
+            idx = cache.get(word, _FILTERED)
+            if idx is _FILTERED:
+                idx = cache[word] = self._word_hash(word)
+            if idx is not None:
+                hashes.append(idx)
+        counts = Counter(hashes)
+        return list(counts.keys()), list(counts.values())
+
+    # ------------------------------------------
+    # Documents
+    # ------------------------------------------
+    def encode_documents(self, texts: Union[str, List[str]]):
+        if isinstance(texts, list) and self.doc_freq is not None and self.n_docs is not None and self.avgdl is not None:
+            return self._encode_document_batch(texts)
+        return super().encode_documents(texts)
+
+    def _encode_single_document(self, text: str) -> dict:
+        return self._encode_document_batch([text])[0]
+
+    def _encode_document_batch(self, texts: List[str]) -> List[dict]:
+        term_freqs = [self._tf(text) for text in texts]
+        lengths = np.array([len(indices) for indices, _ in term_freqs], dtype=np.int64)
+        tf = np.array([v for _, doc_tf in term_freqs for v in doc_tf], dtype=np.int64)
+
+        ends = np.cumsum(lengths)
+        cumulative = np.concatenate(([0], np.cumsum(tf)))
+        tf_sum = cumulative[ends] - cumulative[ends - lengths]
+        denominator = np.repeat(self.k1 * (1.0 - self.b + self.b * (tf_sum / self.avgdl)), lengths) + tf
+        values = (tf / denominator).tolist()
+
+        vectors = []
+        for (indices, _), end, length in zip(term_freqs, ends.tolist(), lengths.tolist()):
+            vectors.append({"indices": indices, "values": values[end - length: end]})
+        return vectors
+
+    def encode_documents_parallel(self, texts: List[str], workers: Optional[int] = None,
+                                  chunk_size: int = 2000) -> List[dict]:
+        """Encodes documents in chunks across `workers` processes (default: all cores), preserving order."""
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(texts) <= chunk_size:
+            return self.encode_documents(list(texts))
+
+        chunks = [list(texts[i: i + chunk_size]) for i in range(0, len(texts), chunk_size)]
+        params = dict(_tokenizer_settings(self), b=self.b, k1=self.k1, avgdl=self.avgdl, n_docs=self.n_docs)
+        with multiprocessing.Pool(workers, initializer=_init_document_worker, initargs=(params,)) as pool:
+            return [vector for chunk in pool.imap(_encode_document_chunk, chunks) for vector in chunk]
+
+    # ------------------------------------------
+    # Queries
+    # ------------------------------------------
+    def _sorted_doc_freq(self) -> Tuple[np.ndarray, np.ndarray]:
+        if isinstance(self.doc_freq, DocFreqArrays):
+            return self.doc_freq.indices, self.doc_freq.values
+        if self._df_source is not self.doc_freq:  # Built once per doc_freq dict (fit / load replace it)
+            indices = np.fromiter(self.doc_freq.keys(), dtype=np.int64, count=len(self.doc_freq))
+            values = np.array(list(self.doc_freq.values()))
+            order = np.argsort(indices, kind="stable")
+            self._df_source, self._df_arrays = self.doc_freq, (indices[order], values[order])
+        return self._df_arrays
+
+    def _encode_single_query(self, text: str) -> dict:
+        indices, _ = self._tf(text)
+        if not indices or not len(self.doc_freq):
+            return super()._encode_single_query(text)
+
+        keys, values = self._sorted_doc_freq()
+        query = np.array(indices, dtype=keys.dtype)
+        pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        df = np.where(keys[pos] == query, values[pos], 1)
+        idf = np.log((self.n_docs + 1) / (df + 0.5))
+        idf_norm = idf / idf.sum()
+        return {"indices": indices, "values": idf_norm.tolist()}
+
+
+_worker_encoder: Optional[FastBM25Encoder] = None
+
+
+def _init_document_worker(params: dict) -> None:
+    global _worker_encoder
+    _worker_encoder = FastBM25Encoder(**{k: params[k] for k in _TOKENIZER_KEYS})
+    _worker_encoder.avgdl, _worker_encoder.n_docs = params["avgdl"], params["n_docs"]
+    _worker_encoder.doc_freq = {}  # Document vectors only depend on avgdl
+
+
+def _encode_document_chunk(texts: List[str]) -> List[dict]:
+    return _worker_encoder.encode_documents(texts)
+
+
+def _tokenizer_settings(encoder: BM25Encoder) -> dict:
+    tokenizer = encoder._tokenizer
+    return {
+        "lower_case": tokenizer.lower_case, "remove_punctuation": tokenizer.remove_punctuation,
+        "remove_stopwords": tokenizer.remove_stopwords, "stem": tokenizer.stem, "language": tokenizer.language,
+    }
+
+
+class ArrayBM25Encoder(FastBM25Encoder):
+    """BM25Encoder whose doc_freq lives in memory-mapped arrays; encodes exactly like the JSON-loaded encoder."""
+
+    @classmethod
+    def load_binary(cls, path: Union[str, Path], reuse: bool = True) -> "ArrayBM25Encoder":
+        """
+        Maps a binary model. With reuse, loads of an unchanged file in one process share one mapping;
+        loading a rewritten file drops the cached mapping of its previous version.
+        """
+        path = str(path)
+        key = (path, os.stat(path).st_mtime_ns)
+        cached = _mapped.get(key) if reuse else None
+        if cached is not None:
+            return cached
+
+        header, offset = _read_header(path)
+        n_terms = header["n_terms"]
+        indices = np.memmap(path, dtype="<u4", mode="r", offset=offset, shape=(n_terms,))
+        offset += 4 * n_terms + _pad(4 * n_terms)
+        values = np.memmap(path, dtype="<f8", mode="r", offset=offset, shape=(n_terms,))
+
+        encoder = cls(**{k: header[k] for k in _TOKENIZER_KEYS})
+        encoder.avgdl = header["avgdl"]
+        encoder.n_docs = header["n_docs"]
+        encoder.doc_freq = DocFreqArrays(indices, values)
+        for stale in [k for k in _mapped if k[0] == path]:
+            del _mapped[stale]
+        _mapped[key] = encoder
+        return encoder
+
+
+def _read_header(path: Union[str, Path]) -> Tuple[dict, int]:
+    """The JSON header of a binary model and the offset its arrays start at."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a binary BM25 model: {path}")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len))
+    offset = len(MAGIC) + 4 + header_len
+    return header, offset + _pad(offset)
+
+
+def write_binary(params: dict, path: Union[str, Path], source: Optional[dict] = None) -> None:
+    """
+    Writes BM25Encoder params (the JSON `get_params()` structure) in the binary format. `source` ({"size",
+    "mtime_ns"} of the JSON weights) is kept in the header, so loaders can tell whether the binary is current.
+    """
+    indices = np.asarray(params["doc_freq"]["indices"], dtype=np.int64)
+    values = np.asarray(params["doc_freq"]["values"], dtype="<f8")
+    if len(indices) and (indices.min() < 0 or indices.max() > 0xFFFFFFFF):
+        raise ValueError("BM25 term hashes must be unsigned 32-bit")
+    if len(np.unique(indices)) != len(indices):
+        raise ValueError("Duplicate BM25 term hashes")
+    order = np.argsort(indices, kind="stable")
+
+    header = {k: params[k] for k in _TOKENIZER_KEYS}
+    header.update(avgdl=params["avgdl"], n_docs=params["n_docs"], n_terms=len(indices))
+    if source is not None:
+        header["source"] = source
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * _pad(len(MAGIC) + 4 + len(header_bytes)))
+        f.write(indices[order].astype("<u4").tobytes())
+        f.write(b"\0" * _pad(4 * len(indices)))
+        f.write(values[order].tobytes())
+    os.replace(tmp_path, path)
+
+
+def convert_json_to_binary(json_path: Union[str, Path], bin_path: Union[str, Path]) -> None:
+    """Converts pinecone_text BM25 JSON weights and checks the round trip is lossless."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        stat = os.fstat(f.fileno())
+        params = json.load(f)
+    write_binary(params, bin_path, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+
+    restored = ArrayBM25Encoder.load_binary(bin_path, reuse=False).get_params()
+    original = dict(zip(params["doc_freq"]["indices"], params["doc_freq"]["values"]))
+    converted = dict(zip(restored["doc_freq"]["indices"], restored["doc_freq"]["values"]))
+    scalars = [k for k in params if k != "doc_freq"]
+    if converted != original or any(restored[k] != params[k] for k in scalars):
+        raise ValueError(f"Binary conversion of {json_path} is not lossless")
+
+
+def binary_path_for(json_path: Union[str, Path]) -> Path:
+    return Path(json_path).with_suffix(".bin")
+
+
+def _binary_is_current(bin_path: Path, json_path: Path) -> bool:
+    """
+    True if the binary was converted from the JSON file as it is now: same size and mtime as recorded in its
+    header, or (binaries written without them) a strictly newer mtime, as equal coarse mtimes prove nothing.
+    """
+    if not json_path.exists():
+        return True
+    stat = json_path.stat()
+    source = _read_header(bin_path)[0].get("source")
+    if source is not None:
+        return source == {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return bin_path.stat().st_mtime_ns > stat.st_mtime_ns
+
+
+def load_bm25(json_path: Union[str, Path]) -> BM25Encoder:
+    """Loads BM25 weights, preferring an up-to-date binary sibling (`<name>.bin`) of the JSON file."""
+    json_path = Path(json_path)
+    bin_path = binary_path_for(json_path)
+    if bin_path.exists() and _binary_is_current(bin_path, json_path):
+        return ArrayBM25Encoder.load_binary(bin_path)
+    if not json_path.exists():
+        raise FileNotFoundError(f"Missing BM25 weights: {json_path}")
+    return FastBM25Encoder().load(str(json_path))
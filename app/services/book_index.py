@@ -0,0 +1,212 @@
+"""Book-level retrieval: searches one embedding per book and pools the hits into publisher scores.
+
+A publisher's profile vector embeds up to 15 blurbs at once, which blurs distinct parts of its catalog. Here each
+book (title + blurb) is its own vector; a query retrieves the best BOOK_CANDIDATES books, and each publisher
+with a hit gets a dense score pooled from its books' scores:
+    max         its best book
+    sum_top_k   the sum of its POOL_TOP_K best books (rewards several close titles)
+    softmax     a softmax(score / SOFTMAX_TEMPERATURE)-weighted mean of its books (between the mean and the max)
+The publisher's BM25 score from the publisher index is added, so with hybrid_convex_scale'd query vectors a
+publisher scores alpha * pooled book similarity + (1 - alpha) * keyword match, like a publisher-level query.
+`BookIndex.query` has the Pinecone / LocalHybridIndex signature, so it can serve as StrategistService.index;
+each match's metadata carries its best-matching books under "evidence_books".
+
+Files in the book index directory:
+    dense*.npy          book embeddings and their quantized copies (app/services/embedding_store.py)
+    books.json          {"ids": [...], "titles": [...], "publisher_ids": [...], "publishers": [...], "settings"},
+                        written last; "publishers" is each book's position in "publisher_ids", and "settings"
+                        what the embeddings were made with (so a later export knows which it can reuse)
+    ann/                IVF-PQ index over the books (app/services/ann_index.py), for large catalogs
+Without ann/, every query scans the (quantized) book vectors; with it, only the probed inverted lists.
+Like the local index, each write builds a stamped directory and publishes it through a pointer file.
+Catalogs larger than RAM are written by streaming vectors into `dense.npy` of a `new_index_dir` (opened with
+np.lib.format.open_memmap) and finishing it with `finish_book_index`.
+"""
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+from app.services.ann_index import IVFPQIndex
+from app.services.embedding_store import RESCORE_CANDIDATES, EmbeddingStore, top_positions, write_quantized_copies
+from app.services.local_index import (
+    LocalHybridIndex,
+    LocalMatch,
+    LocalQueryResponse,
+    new_index_dir,
+    publish_index_dir,
+    resolve_index_dir,
+)
+
+BOOK_INDEX_DIR = "book_index"  # Next to the BM25 weights of the version it belongs to
+BOOKS_FILE = "books.json"
+ANN_DIR = "ann"
+
+POOLINGS = ("max", "sum_top_k", "softmax")
+BOOK_CANDIDATES = 1000  # Books retrieved per query before pooling
+POOL_TOP_K = 3
+SOFTMAX_TEMPERATURE = 0.05
+EVIDENCE_BOOKS = 3  # Best-matching books returned with each publisher
+
+ANN_MIN_BOOKS = 200_000  # Catalogs at least this large get an IVF-PQ index
+ANN_SUBVECTOR_DIM = 16  # IVF-PQ sub-space width: m = dim / 16 bytes per book
+ANN_NPROBE = 64  # Recall / latency knob (see scripts/bench_book_retrieval.py)
+ANN_RESCORE_FACTOR = 4  # IVF-PQ candidates rescored exactly per book kept (PQ scores are coarse)
+
+
+def pool_scores(groups: np.ndarray, scores: np.ndarray, pooling: str = "max", k: int = POOL_TOP_K,
+                temperature: float = SOFTMAX_TEMPERATURE):
+    """Pools item scores by group. Returns (the distinct groups, their pooled scores)."""
+    unique, inverse = np.unique(groups, return_inverse=True)
+    if pooling == "max":
+        pooled = np.full(len(unique), -np.inf)
+        np.maximum.at(pooled, inverse, scores)
+    elif pooling == "sum_top_k":
+        order = np.lexsort((-scores, inverse))  # By group, best first within each
+        sorted_groups = inverse[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_groups, sorted_groups)
+        keep = order[rank < k]
+        pooled = np.bincount(inverse[keep], weights=scores[keep], minlength=len(unique))
+    elif pooling == "softmax":
+        best = np.full(len(unique), -np.inf)
+        np.maximum.at(best, inverse, scores)
+        weights = np.exp((scores - best[inverse]) / temperature)
+        pooled = np.bincount(inverse, weights=weights * scores, minlength=len(unique)) / \
+            np.bincount(inverse, weights=weights, minlength=len(unique))
+    else:
+        raise ValueError(f"Unknown pooling: {pooling} (expected one of {POOLINGS})")
+    return unique, pooled.astype(np.float32)
+
+
+class BookIndex:
+    """Book search pooled into publisher matches; `publishers` supplies their BM25 scores and metadata."""
+
+    def __init__(self, path: Union[str, Path], publishers: LocalHybridIndex, pooling: str = "max",
+                 quantization: str = "float32", rescore: int = RESCORE_CANDIDATES):
+        if pooling not in POOLINGS:
+            raise ValueError(f"Unknown pooling: {pooling} (expected one of {POOLINGS})")
+        path = resolve_index_dir(path)
+        with open(path / BOOKS_FILE, "r", encoding="utf-8") as f:
+            books = json.load(f)
+        self.path = path
+        self.publishers = publishers
+        self.pooling = pooling
+        self.rescore = rescore
+        self.ids = books["ids"]
+        self.titles = books["titles"]
+        self.store = EmbeddingStore(path, quantization)
+        self.ann = IVFPQIndex.load(path / ANN_DIR) if (path / ANN_DIR / "index.json").exists() else None
+
+        # Each book's row in the publisher index (-1 for publishers it no longer has)
+        rows = {publisher_id: row for row, publisher_id in enumerate(publishers.ids)}
+        publisher_rows = np.array([rows.get(p, -1) for p in books["publisher_ids"]], dtype=np.int32)
+        self.book_publishers = publisher_rows[np.asarray(books["publishers"], dtype=np.int64)]
+
+    @classmethod
+    def load(cls, path: Union[str, Path], publishers: LocalHybridIndex, pooling: str = "max",
+             quantization: str = "float32", rescore: int = RESCORE_CANDIDATES) -> "BookIndex":
+        return cls(path, publishers, pooling, quantization, rescore)
+
+    def describe_index_stats(self) -> dict:
+        return {
+            "dimension": int(self.store.shape[1]), "total_vector_count": len(self.publishers.ids),
+            "total_book_count": len(self.ids), "path": str(self.path), "pooling": self.pooling,
+            "quantization": self.store.quantization, "ann": self.ann is not None,
+        }
+
+    def search_books(self, vector: Sequence[float], k: int = BOOK_CANDIDATES):
+        """The k best books by exact dotproduct: (rows, scores), best first."""
+        if self.ann is not None:
+            ids = self.ann.search(vector, k=ANN_RESCORE_FACTOR * k, nprobe=ANN_NPROBE)[0]
+            rows = np.asarray(ids, dtype=np.int64)
+            scores = self.store.exact_scores(vector, rows)
+        elif self.store.quantization == "float32":
+            scores = self.store.approximate_scores(vector)
+            rows = top_positions(scores, k)
+            scores = scores[rows]
+        else:
+            rows = top_positions(self.store.approximate_scores(vector), max(self.rescore, k))
+            scores = self.store.exact_scores(vector, rows)
+        order = top_positions(scores, k)
+        return rows[order], scores[order]
+
+    def query(self, vector: List[float], top_k: int = 10, sparse_vector: Optional[dict] = None,
+              include_metadata: bool = False, namespace: str = "", **kwargs) -> LocalQueryResponse:
+        """Same arguments and result shape as the Pinecone index's query, over publishers with a retrieved book."""
+        rows, scores = self.search_books(vector)
+        publishers = self.book_publishers[rows]
+        rows, scores, publishers = rows[publishers >= 0], scores[publishers >= 0], publishers[publishers >= 0]
+        if len(rows) == 0:
+            return LocalQueryResponse(namespace=namespace)
+
+        candidates, pooled = pool_scores(publishers, scores, self.pooling)
+        if sparse_vector and len(sparse_vector.get("indices", [])):
+            pooled += self.publishers.sparse_scores(sparse_vector)[candidates]
+        best = top_positions(pooled, top_k)
+
+        evidence = {}
+        if include_metadata:
+            wanted = set(candidates[best].tolist())
+            for row, score, publisher in zip(rows.tolist(), scores.tolist(), publishers.tolist()):
+                if publisher in wanted and len(evidence.setdefault(publisher, [])) < EVIDENCE_BOOKS:
+                    evidence[publisher].append({"title": self.titles[row], "score": round(score, 4)})
+
+        matches = []
+        for i in best.tolist():
+            publisher = int(candidates[i])
+            metadata = None
+            if include_metadata:
+                metadata = dict(self.publishers.metadata[publisher] or {}, evidence_books=evidence[publisher])
+            matches.append(LocalMatch(self.publishers.ids[publisher], float(pooled[i]), metadata))
+        return LocalQueryResponse(matches=matches, namespace=namespace)
+
+
+def write_book_index(path: Union[str, Path], books: List[dict], vectors: np.ndarray,
+                     ann_min_books: Optional[int] = ANN_MIN_BOOKS, settings: Optional[dict] = None) -> None:
+    """
+    Writes books ({"book_id", "publisher_id", "title"}) and their embeddings as a book index, with an IVF-PQ index
+    when there are at least `ann_min_books` of them (None: never). Built next to `path` and published atomically.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    build_path = new_index_dir(path)
+    np.save(build_path / "dense.npy", vectors)
+    finish_book_index(path, build_path, books, ann_min_books, settings)
+
+
+def finish_book_index(path: Union[str, Path], build_path: Path, books: List[dict],
+                      ann_min_books: Optional[int] = ANN_MIN_BOOKS, settings: Optional[dict] = None) -> None:
+    """
+    Completes a build directory whose `dense.npy` holds the books' embeddings (row i is books[i]): quantized
+    copies, the IVF-PQ index, then books.json; publishes it at `path`. Reads the vectors through a memory map.
+    """
+    if not books:
+        raise ValueError("No books to write; an empty book index has no embedding dimension")
+    write_quantized_copies(build_path)
+    vectors = np.load(build_path / "dense.npy", mmap_mode="r")
+    if len(vectors) != len(books):
+        raise ValueError(f"{len(books):,} books but {len(vectors):,} vectors")
+    if ann_min_books is not None and len(books) >= ann_min_books:
+        dim = vectors.shape[1]
+        m = next(m for m in range(max(dim // ANN_SUBVECTOR_DIM, 1), 0, -1) if dim % m == 0)
+        ann = IVFPQIndex.train(vectors, nlist=int(4 * np.sqrt(len(vectors))), m=m, store_vectors=False)
+        ann.add(list(range(len(vectors))), vectors)  # Ids are rows; rescoring reads dense.npy
+        ann.save(build_path / ANN_DIR)
+    del vectors
+
+    publisher_ids = list(dict.fromkeys(b["publisher_id"] for b in books))
+    positions = {publisher_id: i for i, publisher_id in enumerate(publisher_ids)}
+    with open(build_path / BOOKS_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "ids": [b["book_id"] for b in books],
+            "titles": [b["title"] for b in books],
+            "publisher_ids": publisher_ids,
+            "publishers": [positions[b["publisher_id"]] for b in books],
+            "settings": settings,
+        }, f)
+    publish_index_dir(path, build_path)
+
+
+def book_index_path(bm25_path: Union[str, Path]) -> Path:
+    """Where the book index of the version with these BM25 weights lives."""
+    return Path(bm25_path).parent / BOOK_INDEX_DIR
@@ -0,0 +1,171 @@
+"""Memory-mapped embedding matrix with int8 / binary quantized copies for a first-pass scan.
+
+Files, next to each other in one directory (`<name>` is e.g. "dense"):
+    <name>.npy              float32[n, dim]          full precision, read only for rows being rescored
+    <name>_int8.npy         int8[n, dim]             x / scale, rounded (4x smaller)
+    <name>_int8_scale.npy   float32[dim]             per-dimension scale: max |x_d| / 127
+    <name>_binary.npy       uint8[n, ceil(dim/64)*8] sign bits, packed and zero-padded to whole uint64 words (32x)
+    <name>_norms.npy        float32[n]               row norms, to put binary estimates on the dotproduct scale
+
+Every file is opened with mmap_mode="r", so all processes serving the same directory (uvicorn workers) share
+one copy in the page cache, and a quantized scan only pulls the small file into it. The float32 mapping is
+advised MADV_RANDOM so rescoring a row doesn't read ahead the rows around it.
+
+Scores from `approximate_scores` estimate the float32 dotproduct x . q:
+    int8:    sum_d int8[d] * (scale[d] * q[d])                    (the scale folds into the query)
+    binary:  |x| |q| cos(pi * hamming(sign x, sign q) / dim)      (sign-agreement estimate of the cosine)
+Callers rescore the best few hundred rows exactly with `exact_scores`.
+"""
+import mmap
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+QUANTIZATIONS = ("float32", "int8", "binary")
+RESCORE_CANDIDATES = 300  # Rows rescored at full precision after a quantized scan
+_CHUNK = 2048  # Rows scanned at a time by the binary scan, bounding temporaries to a few MB
+_INT8_CHUNK_BYTES = 512 * 1024  # int8 rows are widened into one reused float32 buffer this size (stays in L2)
+_WRITE_CHUNK = 65536  # Rows quantized at a time when writing
+
+try:
+    _popcount = np.bitwise_count  # NumPy >= 2.0
+except AttributeError:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words):
+        return _POPCOUNT_TABLE[words.view(np.uint8)]
+
+
+def write_embedding_store(path: Union[str, Path], vectors: np.ndarray, name: str = "dense") -> None:
+    """Writes the float32 matrix and its quantized copies into the directory `path`."""
+    path = Path(path)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(len(vectors), -1) if len(vectors) else vectors.reshape(0, 0)
+    np.save(path / f"{name}.npy", vectors)
+    write_quantized_copies(path, name)
+
+
+def write_quantized_copies(path: Union[str, Path], name: str = "dense") -> None:
+    """
+    Writes the int8 / binary copies and norms of an existing `<name>.npy`, a chunk of rows at a time,
+    so a matrix larger than RAM (streamed into the file with np.lib.format.open_memmap) can be quantized.
+    """
+    path = Path(path)
+    vectors = np.load(path / f"{name}.npy", mmap_mode="r")
+    n, dim = vectors.shape
+    if n == 0:
+        np.save(path / f"{name}_int8.npy", np.empty((0, dim), dtype=np.int8))
+        np.save(path / f"{name}_int8_scale.npy", np.ones(dim, dtype=np.float32))
+        np.save(path / f"{name}_binary.npy", _pack_signs(np.empty((0, dim), dtype=np.float32)))
+        np.save(path / f"{name}_norms.npy", np.empty(0, dtype=np.float32))
+        return
+
+    scale = np.zeros(dim, dtype=np.float32)
+    for start in range(0, n, _WRITE_CHUNK):
+        np.maximum(scale, np.abs(vectors[start: start + _WRITE_CHUNK]).max(axis=0), out=scale)
+    scale = np.where(scale > 0, scale / 127, 1).astype(np.float32)
+    np.save(path / f"{name}_int8_scale.npy", scale)
+
+    int8 = np.lib.format.open_memmap(path / f"{name}_int8.npy", mode="w+", dtype=np.int8, shape=(n, dim))
+    binary = np.lib.format.open_memmap(path / f"{name}_binary.npy", mode="w+", dtype=np.uint8,
+                                       shape=(n, -(-dim // 64) * 8))
+    norms = np.empty(n, dtype=np.float32)
+    for start in range(0, n, _WRITE_CHUNK):
+        chunk = np.asarray(vectors[start: start + _WRITE_CHUNK])
+        int8[start: start + len(chunk)] = np.clip(np.rint(chunk / scale), -127, 127)
+        binary[start: start + len(chunk)] = _pack_signs(chunk)
+        norms[start: start + len(chunk)] = np.linalg.norm(chunk, axis=1)
+    int8.flush()
+    binary.flush()
+    del int8, binary
+    np.save(path / f"{name}_norms.npy", norms)
+
+
+def top_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first (none for k <= 0 or no scores)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _pack_signs(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits, packed into whole uint64 words (padding bits are 0 in both document and query)."""
+    dim = vectors.shape[-1]
+    padded = np.zeros(vectors.shape[:-1] + (-(-dim // 64) * 64,), dtype=bool)
+    padded[..., :dim] = vectors > 0
+    return np.packbits(padded, axis=-1)
+
+
+def _advise_random(array: np.ndarray) -> None:
+    mapping = getattr(array, "_mmap", None)
+    if mapping is not None and hasattr(mmap, "MADV_RANDOM"):
+        mapping.madvise(mmap.MADV_RANDOM)
+
+
+class EmbeddingStore:
+    """First-pass scan over a quantized copy, exact rescoring from the memory-mapped float32 matrix."""
+
+    def __init__(self, path: Union[str, Path], quantization: str = "float32", name: str = "dense"):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization} (expected one of {QUANTIZATIONS})")
+        path = Path(path)
+        if quantization != "float32" and not (path / f"{name}_{quantization}.npy").exists():
+            quantization = "float32"  # Written before quantized copies existed
+        self.quantization = quantization
+        self.vectors = np.load(path / f"{name}.npy", mmap_mode="r")
+        if quantization != "float32":
+            _advise_random(self.vectors)
+        if quantization == "int8":
+            self.codes = np.load(path / f"{name}_int8.npy", mmap_mode="r")
+            self.scale = np.load(path / f"{name}_int8_scale.npy")
+        elif quantization == "binary":
+            self.codes = np.load(path / f"{name}_binary.npy", mmap_mode="r").view(np.uint64)
+            self.norms = np.load(path / f"{name}_norms.npy", mmap_mode="r")
+
+    @property
+    def shape(self):
+        return self.vectors.shape
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def scan_nbytes(self) -> int:
+        """Bytes a full first-pass scan reads."""
+        return self.vectors.nbytes if self.quantization == "float32" else self.codes.nbytes
+
+    def approximate_scores(self, query: Sequence[float]) -> np.ndarray:
+        """Dotproduct of every row with the query: exact for float32, estimated for int8 / binary."""
+        query = np.asarray(query, dtype=np.float32)
+        if self.quantization == "float32":
+            return self.vectors @ query
+
+        scores = np.empty(len(self), dtype=np.float32)
+        if self.quantization == "int8":
+            scaled = self.scale * query
+            rows = max(_INT8_CHUNK_BYTES // (4 * max(len(query), 1)), 1)
+            buffer = np.empty((rows, len(query)), dtype=np.float32)
+            for start in range(0, len(self), rows):
+                codes = self.codes[start: start + rows]
+                widened = buffer[:len(codes)]
+                np.copyto(widened, codes, casting="unsafe")
+                np.matmul(widened, scaled, out=scores[start: start + len(codes)])
+        else:
+            query_bits = _pack_signs(query).view(np.uint64)
+            angle = np.float32(np.pi / self.vectors.shape[1])
+            for start in range(0, len(self), _CHUNK):
+                hamming = _popcount(self.codes[start: start + _CHUNK] ^ query_bits).sum(axis=1, dtype=np.int32)
+                scores[start: start + _CHUNK] = np.cos(angle * hamming)
+            scores *= self.norms * np.linalg.norm(query)
+        return scores
+
+    def exact_scores(self, query: Sequence[float], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Full-precision dotproducts of the given rows (default: all of them)."""
+        query = np.asarray(query, dtype=np.float32)
+        if rows is None:
+            return self.vectors @ query
+        return self.vectors[rows] @ query  # Touches only these rows' pages of the mapping
@@ -0,0 +1,192 @@
+"""In-process hybrid publisher index: a drop-in for the Pinecone index handle behind StrategistService.index.
+
+Files in the index directory:
+    dense*.npy                              publisher embeddings and their int8 / binary quantized copies
+                                            (app/services/embedding_store.py)
+    sparse_terms.npy    uint32[n_terms]     BM25 term hashes, sorted
+    sparse_indptr.npy   int64[n_terms + 1]  row pointers of the term-major CSR sparse matrix (the doc x term
+                                            BM25 matrix transposed, so a query only touches its own terms)
+    sparse_docs.npy     int32[nnz]          publisher rows holding each term
+    sparse_values.npy   float32[nnz]        their BM25 document values
+    records.json        {"ids": [...], "metadata": [...]}, written last
+
+Each write goes to a new stamped directory next to the index path (`local_index.<ns>`) and is published by
+atomically replacing the pointer file `local_index.current` with its name; readers open the directory the
+pointer names (`resolve_index_dir`), so the published index never disappears mid-swap.
+
+Arrays are memory-mapped on load. Scores are the dotproduct Pinecone computes for a hybrid query
+(dense . q_dense + sparse . q_sparse), in float32 like Pinecone's stored values, and `query` returns the
+same `.matches` shape (id, score, metadata). With a quantized dense store, candidates are ranked on the
+estimated hybrid score and the best `rescore` of them are scored exactly before the top_k is taken.
+"""
+import json
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+from app.services.embedding_store import RESCORE_CANDIDATES, EmbeddingStore, top_positions, write_embedding_store
+
+LOCAL_INDEX_DIR = "local_index"  # Next to the BM25 weights of the version it mirrors
+RECORDS_FILE = "records.json"
+CURRENT_SUFFIX = ".current"  # Pointer file naming the published directory of an index path
+
+
+@dataclass
+class LocalMatch:
+    id: str
+    score: float
+    metadata: Optional[dict] = None
+
+
+@dataclass
+class LocalQueryResponse:
+    matches: List[LocalMatch] = field(default_factory=list)
+    namespace: str = ""
+
+
+class LocalHybridIndex:
+    """Brute-force hybrid dotproduct search over a few tens of thousands of publishers, held in RAM."""
+
+    def __init__(self, path: Union[str, Path], quantization: str = "float32", rescore: int = RESCORE_CANDIDATES):
+        path = resolve_index_dir(path)
+        with open(path / RECORDS_FILE, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self.path = path
+        self.ids = records["ids"]
+        self.metadata = records["metadata"]
+        self.store = EmbeddingStore(path, quantization)
+        self.rescore = rescore
+        self.terms = np.load(path / "sparse_terms.npy", mmap_mode="r")
+        self.indptr = np.load(path / "sparse_indptr.npy", mmap_mode="r")
+        self.docs = np.load(path / "sparse_docs.npy", mmap_mode="r")
+        self.values = np.load(path / "sparse_values.npy", mmap_mode="r")
+
+    @classmethod
+    def load(cls, path: Union[str, Path], quantization: str = "float32",
+             rescore: int = RESCORE_CANDIDATES) -> "LocalHybridIndex":
+        return cls(path, quantization, rescore)
+
+    def describe_index_stats(self) -> dict:
+        return {
+            "dimension": int(self.store.shape[1]), "total_vector_count": len(self.ids), "path": str(self.path),
+            "quantization": self.store.quantization,
+        }
+
+    def _add_sparse(self, scores: np.ndarray, sparse_vector: Optional[dict]) -> np.ndarray:
+        if sparse_vector and len(sparse_vector.get("indices", [])) and len(self.terms):
+            query_terms = np.asarray(sparse_vector["indices"], dtype=self.terms.dtype)
+            weights = np.asarray(sparse_vector["values"], dtype=np.float32)
+            pos = np.minimum(np.searchsorted(self.terms, query_terms), len(self.terms) - 1)
+            for p, found, weight in zip(pos, self.terms[pos] == query_terms, weights):
+                if found:
+                    start, end = self.indptr[p], self.indptr[p + 1]
+                    scores[self.docs[start:end]] += weight * self.values[start:end]
+        return scores
+
+    def sparse_scores(self, sparse_vector: Optional[dict]) -> np.ndarray:
+        """BM25 dotproduct score of every publisher."""
+        return self._add_sparse(np.zeros(len(self.ids), dtype=np.float32), sparse_vector)
+
+    def scores(self, vector: List[float], sparse_vector: Optional[dict] = None) -> np.ndarray:
+        """Hybrid dotproduct score of every publisher (with the dense part estimated if the store is quantized)."""
+        return self._add_sparse(self.store.approximate_scores(vector), sparse_vector)
+
+    def query(self, vector: List[float], top_k: int = 10, sparse_vector: Optional[dict] = None,
+              include_metadata: bool = False, namespace: str = "", **kwargs) -> LocalQueryResponse:
+        """Same arguments and result shape as the Pinecone index's query (namespaces are separate directories)."""
+        if self.store.quantization == "float32":
+            scores = self.scores(vector, sparse_vector)
+            rows = top_positions(scores, top_k)
+        else:
+            sparse = self.sparse_scores(sparse_vector)
+            candidates = top_positions(self.store.approximate_scores(vector) + sparse, max(self.rescore, top_k))
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            scores[candidates] = self.store.exact_scores(vector, candidates) + sparse[candidates]
+            rows = candidates[top_positions(scores[candidates], top_k)]
+        return LocalQueryResponse(
+            matches=[
+                LocalMatch(self.ids[i], float(scores[i]), self.metadata[i] if include_metadata else None)
+                for i in rows.tolist()
+            ],
+            namespace=namespace,
+        )
+
+
+def resolve_index_dir(path: Union[str, Path]) -> Path:
+    """The directory published at an index path: the one its pointer file names, else the path itself."""
+    path = Path(path)
+    try:
+        return path.parent / path.with_name(path.name + CURRENT_SUFFIX).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return path  # Written before pointer files, or by hand
+
+
+def new_index_dir(path: Union[str, Path]) -> Path:
+    """A fresh stamped directory to build the next version of an index path in."""
+    path = Path(path)
+    build_path = path.with_name(f"{path.name}.{time.time_ns()}")
+    build_path.mkdir(parents=True)
+    return build_path
+
+
+def publish_index_dir(path: Union[str, Path], build_path: Path) -> None:
+    """
+    Points the index path at a finished build directory with one atomic rename, then removes older builds.
+    The previously published directory is kept for readers that resolved it just before the swap.
+    """
+    path = Path(path)
+    previous = resolve_index_dir(path)
+    pointer = path.with_name(path.name + CURRENT_SUFFIX)
+    tmp_pointer = pointer.with_name(pointer.name + ".tmp")
+    tmp_pointer.write_text(build_path.name, encoding="utf-8")
+    os.replace(tmp_pointer, pointer)
+
+    stamped = re.compile(re.escape(path.name) + r"\.\d+")
+    for old_path in path.parent.iterdir():
+        if old_path.is_dir() and old_path not in (build_path, previous) and (
+                old_path == path or stamped.fullmatch(old_path.name)):
+            shutil.rmtree(old_path, ignore_errors=True)  # Still-mapped files go on a later publish (Windows)
+
+
+def write_local_index(path: Union[str, Path], records: List[dict]) -> None:
+    """
+    Writes Pinecone upsert records ({"id", "values", "metadata", optional "sparse_values"}) as a local index.
+    The directory is built next to `path` and published atomically, so a serving process never sees a partial
+    or missing index.
+    """
+    if not records:
+        raise ValueError("No records to write; an empty local index has no embedding dimension")
+    path = Path(path)
+    tmp_path = new_index_dir(path)
+
+    write_embedding_store(tmp_path, np.asarray([r["values"] for r in records], dtype=np.float32))
+
+    doc_rows, term_ids, term_values = [], [], []
+    for row, record in enumerate(records):
+        sparse = record.get("sparse_values") or {"indices": [], "values": []}
+        doc_rows.extend([row] * len(sparse["indices"]))
+        term_ids.extend(sparse["indices"])
+        term_values.extend(sparse["values"])
+    term_ids = np.asarray(term_ids, dtype=np.uint32)
+    order = np.argsort(term_ids, kind="stable")
+    terms, counts = np.unique(term_ids[order], return_counts=True)
+    np.save(tmp_path / "sparse_terms.npy", terms)
+    np.save(tmp_path / "sparse_indptr.npy", np.concatenate(([0], np.cumsum(counts))).astype(np.int64))
+    np.save(tmp_path / "sparse_docs.npy", np.asarray(doc_rows, dtype=np.int32)[order])
+    np.save(tmp_path / "sparse_values.npy", np.asarray(term_values, dtype=np.float32)[order])
+
+    with open(tmp_path / RECORDS_FILE, "w", encoding="utf-8") as f:
+        json.dump({"ids": [r["id"] for r in records], "metadata": [r.get("metadata") for r in records]}, f)
+
+    publish_index_dir(path, tmp_path)
+
+
+def local_index_path(bm25_path: Union[str, Path]) -> Path:
+    """Where the local index mirroring the version with these BM25 weights lives."""
+    return Path(bm25_path).parent / LOCAL_INDEX_DIR
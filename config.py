@@ -13,6 +13,21 @@ CHAT_MODEL = "RPRTHPB-gpt-5-mini"
 EMBED_MODEL = "RPRTHPB-text-embedding-3-small"
 PINECONE_INDEX = "slushpilot-publishers"
 STRATEGIST_BM25_PATH = "Strategist/bm25_publisher_weights.json"
+# Blue/green index versions: names the active namespace + BM25 weights (default namespace + the path above if absent)
+STRATEGIST_INDEX_ALIAS_PATH = "Strategist/index_alias.json"
+# "pinecone", or "local" to search an in-process copy of the active version (app/services/local_index.py)
+STRATEGIST_BACKEND = os.getenv("STRATEGIST_BACKEND", "pinecone")
+# Local backend's first-pass dense scan: "binary" (32x less memory, fastest), "int8" (4x less, about as fast as
+# float32 in NumPy) or "float32" (exact, no rescoring); the best STRATEGIST_RESCORE_CANDIDATES of a quantized scan
+# are rescored at full precision (app/services/embedding_store.py). On 34k x 1536 binary + 300 rescored keeps
+# recall@10 at 1.0; check it with scripts/bench_embedding_store.py on the real index.
+STRATEGIST_DENSE_QUANTIZATION = os.getenv("STRATEGIST_DENSE_QUANTIZATION", "binary")
+STRATEGIST_RESCORE_CANDIDATES = int(os.getenv("STRATEGIST_RESCORE_CANDIDATES", "300"))
+# "publishers" searches one vector per publisher; "books" searches the version's book index and pools book hits
+# into publisher scores with STRATEGIST_BOOK_POOLING: "max", "sum_top_k" or "softmax" (app/services/book_index.py).
+# Book retrieval runs in-process on the version's local exports, whichever STRATEGIST_BACKEND is set
+STRATEGIST_RETRIEVAL = os.getenv("STRATEGIST_RETRIEVAL", "publishers")
+STRATEGIST_BOOK_POOLING = os.getenv("STRATEGIST_BOOK_POOLING", "max")
 
 ARCHITECTURE_IMAGE = "images/SlushPilot.png"
 
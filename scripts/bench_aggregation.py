@@ -0,0 +1,123 @@
+"""Benchmarks for the publisher aggregation step on the merged dataset.
+
+    python scripts/bench_aggregation.py <merged.{jsonl,parquet}> [--workers N]
+        Serial vs. parallel: checks the profiles files are byte-identical and reports the speedup.
+
+    python scripts/bench_aggregation.py <merged.{jsonl,parquet}> --memory
+        tracemalloc peak of bounded top-K book retention vs. keeping every book per publisher.
+
+    python scripts/bench_aggregation.py <merged.{jsonl,parquet}> --heavy-hitters CAPACITY
+        Top-10 genre/shelf agreement of Space-Saving sketches against exact Counters.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "Strategist"))
+
+import aggregation  # noqa: E402
+from aggregation import aggregate_publishers, load_terms, write_profiles  # noqa: E402
+
+
+def _run(fmt, path, workers, out_path):
+    started = time.perf_counter()
+    publishers = aggregate_publishers(fmt, path, workers=workers)
+    elapsed = time.perf_counter() - started
+    write_profiles(publishers, out_path, load_terms(fmt, path))
+    return elapsed
+
+
+def _speedup(fmt, path, workers) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        serial_out = os.path.join(tmp, "serial.jsonl")
+        parallel_out = os.path.join(tmp, "parallel.jsonl")
+        serial_s = _run(fmt, path, 1, serial_out)
+        parallel_s = _run(fmt, path, workers, parallel_out)
+
+        with open(serial_out, "rb") as a, open(parallel_out, "rb") as b:
+            identical = a.read() == b.read()
+
+    print(f"serial:   {serial_s:8.2f}s")
+    print(f"parallel: {parallel_s:8.2f}s  ({workers} workers)")
+    print(f"speedup:  {serial_s / parallel_s:8.2f}x")
+    print(f"profiles byte-identical: {identical}")
+    return 0 if identical else 1
+
+
+def _peak_mb(fmt, path):
+    tracemalloc.start()
+    publishers = aggregate_publishers(fmt, path, workers=1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n_books = sum(len(p["books"]) for p in publishers.values())
+    return peak / 1e6, n_books
+
+
+def _memory(fmt, path) -> int:
+    top_k = aggregation.TOP_BLURBS
+    bounded_mb, bounded_books = _peak_mb(fmt, path)
+
+    # An unbounded heap retains every book, like the old per-publisher `books` list
+    aggregation.TOP_BLURBS = sys.maxsize
+    try:
+        unbounded_mb, unbounded_books = _peak_mb(fmt, path)
+    finally:
+        aggregation.TOP_BLURBS = top_k
+
+    print(f"all books retained: peak {unbounded_mb:9.1f} MB  ({unbounded_books:,} books held)")
+    print(f"top-{top_k} heap:        peak {bounded_mb:9.1f} MB  ({bounded_books:,} books held)")
+    print(f"reduction:          {unbounded_mb / bounded_mb:9.1f}x")
+    return 0
+
+
+def _top10_agreement(exact, approx):
+    """(mean top-10 set overlap, share of identical top-10 lists) over publishers that get a profile."""
+    overlaps, identical, n = 0.0, 0, 0
+    for pub, data in exact.items():
+        if data["vol"] < 2: continue
+        for field in ("genres", "shelves"):
+            want = [k for k, _ in data[field].most_common(10)]
+            got = [k for k, _ in approx[pub][field].most_common(10)]
+            if not want: continue
+            overlaps += len(set(want) & set(got)) / len(want)
+            identical += set(want) == set(got)
+            n += 1
+    return overlaps / max(n, 1), identical / max(n, 1)
+
+
+def _heavy_hitters(fmt, path, workers, capacity) -> int:
+    exact = aggregate_publishers(fmt, path, workers=workers)
+    approx = aggregate_publishers(fmt, path, workers=workers, heavy_hitters=capacity)
+
+    exact_keys = sum(len(p["genres"]) + len(p["shelves"]) for p in exact.values())
+    approx_keys = sum(len(p["genres"].counts) + len(p["shelves"].counts) for p in approx.values())
+    overlap, identical = _top10_agreement(exact, approx)
+
+    print(f"tracked keys: exact {exact_keys:,}  sketch {approx_keys:,} (capacity {capacity})")
+    print(f"top-10 overlap: {overlap:.2%}  identical top-10 sets: {identical:.2%}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("merged_path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--memory", action="store_true")
+    parser.add_argument("--heavy-hitters", type=int, metavar="CAPACITY")
+    args = parser.parse_args()
+    fmt = "parquet" if args.merged_path.endswith(".parquet") else "jsonl"
+
+    if args.memory:
+        return _memory(fmt, args.merged_path)
+    if args.heavy_hitters:
+        return _heavy_hitters(fmt, args.merged_path, args.workers, args.heavy_hitters)
+    return _speedup(fmt, args.merged_path, args.workers)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,115 @@
+"""Recall@k vs. latency of the IVF-PQ index (app/services/ann_index.py) against exact inner-product search.
+
+    python scripts/bench_ann.py [vectors.npy | local_index_dir] [--nlist N] [--m M] [--k K] [--queries N]
+    python scripts/bench_ann.py --synthetic 200000 --dim 256
+
+Builds the index from the vectors (a float32 .npy, the dense.npy of a local index, or synthetic clustered
+unit vectors), saves and reloads it, inserts a held-out slice incrementally, then sweeps nprobe x rerank.
+Queries are held-out vectors plus noise, so they are near but not equal to indexed ones.
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from app.services.ann_index import IVFPQIndex  # noqa: E402
+from app.services.local_index import resolve_index_dir  # noqa: E402
+
+NPROBES = (1, 4, 16, 64)
+RERANKS = (0, 100, 500)
+
+
+def _synthetic(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors around a few thousand topic centres, like embeddings of books in many genres."""
+    centres = rng.standard_normal((max(n // 100, 1), dim)).astype(np.float32)
+    vectors = centres[rng.integers(len(centres), size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _load(source: str) -> np.ndarray:
+    path = resolve_index_dir(source)
+    if path.is_dir():
+        path = path / "dense.npy"
+    return np.load(path).astype(np.float32)
+
+
+def _dir_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("vectors", nargs="?")
+    parser.add_argument("--synthetic", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--nlist", type=int, default=0, help="Default: about 4 * sqrt(n)")
+    parser.add_argument("--m", type=int, default=0, help="PQ sub-spaces. Default: dim / 4")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--insert-fraction", type=float, default=0.1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = _load(args.vectors) if args.vectors else _synthetic(args.synthetic, args.dim, rng)
+    n, dim = vectors.shape
+    nlist = args.nlist or max(int(4 * np.sqrt(n)), 1)
+    m = args.m or max(dim // 4, 1)
+    ids = [str(i) for i in range(n)]
+    split = int(n * (1 - args.insert_fraction))
+    print(f"{n:,} vectors x {dim}, nlist={nlist}, m={m}")
+
+    started = time.perf_counter()
+    index = IVFPQIndex.train(vectors[:split], nlist=nlist, m=m)
+    index.add(ids[:split], vectors[:split])
+    print(f"train + add {split:,}: {time.perf_counter() - started:.1f}s")
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        index.save(tmp_dir)
+        index = IVFPQIndex.load(tmp_dir)
+        started = time.perf_counter()
+        index.add(ids[split:], vectors[split:])
+        index.save(tmp_dir)
+        print(f"incremental add {n - split:,}: {time.perf_counter() - started:.1f}s")
+        index = IVFPQIndex.load(tmp_dir)
+        codes_mb = len(index) * index.m / 1e6  # One uint8 code per sub-space
+        print(f"on disk: {_dir_mb(tmp_dir):.1f} MB ({codes_mb:.1f} MB of PQ codes, {vectors.nbytes / 1e6:.1f} MB raw)")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    picks = rng.choice(n, size=min(args.queries, n), replace=False)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((len(picks), dim)).astype(np.float32)
+
+    exact, exact_ms = [], []
+    for q in queries:
+        started = time.perf_counter()
+        scores = vectors @ q
+        top = np.argpartition(-scores, args.k - 1)[:args.k]
+        exact_ms.append((time.perf_counter() - started) * 1e3)
+        exact.append(set(top.tolist()))
+    print(f"\nexact:                       recall 1.000  p50 {np.percentile(exact_ms, 50):7.2f} ms"
+          f"  p95 {np.percentile(exact_ms, 95):7.2f} ms")
+
+    for nprobe in NPROBES:
+        for rerank in RERANKS:
+            hits, latencies = 0, []
+            for q, truth in zip(queries, exact):
+                started = time.perf_counter()
+                found, _ = index.search(q, k=args.k, nprobe=nprobe, rerank=rerank)
+                latencies.append((time.perf_counter() - started) * 1e3)
+                hits += len(truth.intersection(int(i) for i in found))
+            print(f"nprobe {nprobe:>4}  rerank {rerank:>4}:  recall {hits / (len(queries) * args.k):.3f}"
+                  f"  p50 {np.percentile(latencies, 50):7.2f} ms  p95 {np.percentile(latencies, 95):7.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,71 @@
+"""Benchmarks FastBM25Encoder (app/services/bm25.py) against pinecone_text's BM25Encoder.
+
+    python scripts/bench_bm25.py [profiles.jsonl] [--weights bm25.json] [--workers N] [--queries N]
+
+Encodes the sparse_text of every publisher profile (the corpus the weights were fit on; 33,754 publishers for
+the shipped weights) with the reference encoder, FastBM25Encoder, and FastBM25Encoder's multi-process batch
+API, then encodes queries built from the profiles' dense_text. Exits non-zero unless every sparse vector is
+bit-identical to the reference.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import config  # noqa: E402
+from app.services.bm25 import FastBM25Encoder  # noqa: E402
+from pinecone_text.sparse import BM25Encoder  # noqa: E402
+
+DEFAULT_PROFILES = ROOT_DIR / "Strategist" / "slushpilot_publisher_profiles.jsonl"
+
+
+def _timed(label, fn, n_items, baseline=None):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    speedup = f"  ({baseline / elapsed:5.2f}x)" if baseline else ""
+    print(f"{label:<28} {elapsed:8.2f}s  {n_items / elapsed:10,.0f}/s{speedup}")
+    return result, elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("profiles", nargs="?", default=str(DEFAULT_PROFILES))
+    parser.add_argument("--weights", default=str(ROOT_DIR / config.STRATEGIST_BM25_PATH))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(args.profiles, "r", encoding="utf-8") as f:
+        profiles = [json.loads(line) for line in f]
+    documents = [p["sparse_text"] for p in profiles]
+    queries = [p["dense_text"][:500] for p in profiles[: args.queries]]
+
+    reference = BM25Encoder().load(args.weights)
+    fast = FastBM25Encoder().load(args.weights)
+    print(f"{len(documents):,} documents, {len(queries):,} queries (weights fit on {reference.n_docs:,} documents)")
+
+    expected, ref_s = _timed("documents: BM25Encoder", lambda: reference.encode_documents(documents), len(documents))
+    serial, _ = _timed("documents: fast", lambda: FastBM25Encoder().load(args.weights).encode_documents(documents),
+                       len(documents), ref_s)
+    parallel, _ = _timed(f"documents: fast x{args.workers}",
+                         lambda: fast.encode_documents_parallel(documents, workers=args.workers),
+                         len(documents), ref_s)
+
+    expected_q, ref_q = _timed("queries: BM25Encoder", lambda: reference.encode_queries(queries), len(queries))
+    fast_q, _ = _timed("queries: fast", lambda: FastBM25Encoder().load(args.weights).encode_queries(queries),
+                       len(queries), ref_q)
+
+    identical = serial == expected and parallel == expected and fast_q == expected_q
+    print(f"bit-identical: {identical}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
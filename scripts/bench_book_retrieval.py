@@ -0,0 +1,131 @@
+"""Per-query latency and recall of book-level retrieval (app/services/book_index.py) at catalog scale.
+
+    python scripts/bench_book_retrieval.py [--books 1000000] [--publishers 34000] [--dim 256] [--queries 100]
+
+Generates a synthetic catalog (books clustered by topic, publishers with Zipf-sized lists, publisher vectors the
+normalized mean of their books, like a profile embedded from its blurbs), writes a publisher local index and a
+book index with and without IVF-PQ, and reports p50 / p95 query latency of:
+    publishers              one vector per publisher (the current retrieval), for the per-query budget
+    books exact / <quant>   book scan over float32 / int8 / binary copies with rescoring, then pooling
+    books ann nprobe N      IVF-PQ candidates, exact rescoring, then pooling
+with the top-20 publisher overlap against exact book pooling. Queries are books plus noise.
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import app.services.book_index as book_index  # noqa: E402
+from app.services.book_index import BookIndex, write_book_index  # noqa: E402
+from app.services.local_index import LocalHybridIndex, write_local_index  # noqa: E402
+
+TOP_K = 20
+NPROBES = (16, 32, 64, 128, 256)
+
+
+def _catalog(n_books, n_publishers, dim, rng):
+    topics = rng.standard_normal((max(n_books // 200, 1), dim)).astype(np.float32)
+    # Each publisher works a few topics in its own style; its books are noisy variations of those
+    publisher_topics = rng.integers(len(topics), size=(n_publishers, 3))
+    styles = rng.standard_normal((n_publishers, dim)).astype(np.float32)
+    sizes = np.minimum(rng.zipf(1.3, size=n_publishers), 5000).astype(np.float64)
+    publishers = rng.choice(n_publishers, size=n_books, p=sizes / sizes.sum())
+    vectors = np.empty((n_books, dim), dtype=np.float32)
+    for start in range(0, n_books, 100_000):
+        end = min(start + 100_000, n_books)
+        block_publishers = publishers[start:end]
+        chosen = publisher_topics[block_publishers, rng.integers(3, size=end - start)]
+        block = topics[chosen] + 0.7 * styles[block_publishers] + \
+            0.7 * rng.standard_normal((end - start, dim)).astype(np.float32)
+        vectors[start:end] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors, publishers
+
+
+def _latency(fn, queries):
+    results, latencies = [], []
+    for q in queries:
+        started = time.perf_counter()
+        results.append(fn(q))
+        latencies.append((time.perf_counter() - started) * 1e3)
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--publishers", type=int, default=34_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    vectors, book_publishers = _catalog(args.books, args.publishers, args.dim, rng)
+    present = np.unique(book_publishers)
+    sums = np.zeros((args.publishers, args.dim), dtype=np.float32)
+    np.add.at(sums, book_publishers, vectors)
+    profile_vectors = sums[present] / np.linalg.norm(sums[present], axis=1, keepdims=True)
+    books = [{"book_id": f"b{i}", "publisher_id": f"p{p}", "title": f"book {i}"}
+             for i, p in enumerate(book_publishers.tolist())]
+    print(f"{args.books:,} books x {args.dim} over {len(present):,} publishers "
+          f"(generated in {time.perf_counter() - started:.0f}s)")
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        write_local_index(tmp_dir / "local_index", [
+            {"id": f"p{p}", "values": v, "metadata": {"publisher_name": f"p{p}"}}
+            for p, v in zip(present.tolist(), profile_vectors.tolist())
+        ])
+        started = time.perf_counter()
+        write_book_index(tmp_dir / "book_index", books, vectors, ann_min_books=None)
+        print(f"book index: {time.perf_counter() - started:.0f}s")
+        started = time.perf_counter()
+        write_book_index(tmp_dir / "book_index_ann", books, vectors, ann_min_books=0)
+        print(f"book index with IVF-PQ: {time.perf_counter() - started:.0f}s\n")
+        del vectors
+
+        picks = rng.choice(args.books, size=args.queries, replace=False)
+        exact_index = BookIndex(tmp_dir / "book_index", LocalHybridIndex(tmp_dir / "local_index"))
+        queries = exact_index.store.vectors[picks] + 0.05 * rng.standard_normal((len(picks), args.dim))
+        queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+        def top_ids(index):
+            return lambda q: {m.id for m in index.query(q, top_k=TOP_K).matches}
+
+        _, p50, p95 = _latency(top_ids(LocalHybridIndex(tmp_dir / "local_index")), queries)
+        print(f"{'publishers (float32)':<28} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+        truth, p50, p95 = _latency(top_ids(exact_index), queries)
+        print(f"{'books exact (float32)':<28} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  overlap@{TOP_K} 1.000")
+
+        def report(label, index):
+            found, p50, p95 = _latency(top_ids(index), queries)
+            overlap = np.mean([len(t & f) / TOP_K for t, f in zip(truth, found)])
+            print(f"{label:<28} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  overlap@{TOP_K} {overlap:.3f}")
+
+        publishers = LocalHybridIndex(tmp_dir / "local_index")
+        for quantization in ("int8", "binary"):
+            report(f"books {quantization} + rescore", BookIndex(tmp_dir / "book_index", publishers,
+                                                               quantization=quantization))
+        ann_index = BookIndex(tmp_dir / "book_index_ann", publishers, quantization="binary")
+        nprobe = book_index.ANN_NPROBE
+        try:
+            for book_index.ANN_NPROBE in NPROBES:
+                report(f"books ann nprobe {book_index.ANN_NPROBE}", ann_index)
+        finally:
+            book_index.ANN_NPROBE = nprobe
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
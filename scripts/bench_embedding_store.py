@@ -0,0 +1,119 @@
+"""Recall and latency of the quantized embedding store (app/services/embedding_store.py) against float32 search.
+
+    python scripts/bench_embedding_store.py [local_index_dir | vectors.npy] [--k K] [--queries N]
+    python scripts/bench_embedding_store.py --synthetic 34000 --dim 1536
+
+For each quantization and rescore depth: recall@k of the exact float32 top-k, p50 / p95 latency, the bytes one
+query reads, and the file-backed memory the searching process has mapped after all queries (RssFile; Linux),
+measured in a fresh process per setting the way a uvicorn worker would see it. Queries are indexed vectors plus
+noise, so they sit near real neighbours.
+
+The mapped figure for rescoring settings grows with the distinct float32 rows the queries touch, and on a file
+that was just written (still in the page cache as large folios) each touched row maps its whole folio.
+"""
+import argparse
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from app.services.embedding_store import EmbeddingStore, write_embedding_store  # noqa: E402
+from app.services.local_index import resolve_index_dir  # noqa: E402
+
+SETTINGS = [("float32", 0), ("int8", 0), ("int8", 100), ("int8", 300), ("binary", 0), ("binary", 100),
+            ("binary", 300), ("binary", 1000)]
+
+
+def _synthetic(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors around topic centres, roughly as clustered as publisher embeddings."""
+    centres = rng.standard_normal((max(n // 50, 1), dim)).astype(np.float32)
+    vectors = centres[rng.integers(len(centres), size=n)] + 1.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _rss_file_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("RssFile:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def _run(path, quantization, rescore, queries, k):
+    """One worker's view: open the store, answer every query, report hits, latencies and mapped memory."""
+    store = EmbeddingStore(path, quantization)
+    baseline = _rss_file_mb()
+    results, latencies = [], []
+    for q in queries:
+        started = time.perf_counter()
+        scores = store.approximate_scores(q)
+        if rescore:
+            candidates = np.argpartition(-scores, rescore - 1)[:rescore]
+            scores = np.full(len(store), -np.inf, dtype=np.float32)
+            scores[candidates] = store.exact_scores(q, candidates)
+        results.append(np.argpartition(-scores, k - 1)[:k])
+        latencies.append((time.perf_counter() - started) * 1e3)
+    read_mb = (store.scan_nbytes + rescore * store.shape[1] * 4) / 1e6
+    return results, latencies, _rss_file_mb() - baseline, read_mb
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", nargs="?")
+    parser.add_argument("--synthetic", type=int, default=34_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        source = resolve_index_dir(args.source) if args.source else None
+        if source is not None and source.is_dir():
+            path = source
+            vectors = np.load(path / "dense.npy", mmap_mode="r")
+            if not (path / "dense_int8.npy").exists():
+                path = tmp_dir
+                write_embedding_store(path, vectors)
+        else:
+            vectors = np.load(source) if source is not None else _synthetic(args.synthetic, args.dim, rng)
+            path = tmp_dir
+            write_embedding_store(path, vectors)
+
+        n, dim = vectors.shape
+        picks = rng.choice(n, size=min(args.queries, n), replace=False)
+        queries = np.asarray(vectors[picks]) + 0.03 * rng.standard_normal((len(picks), dim)).astype(np.float32)
+        print(f"{n:,} vectors x {dim}, {len(queries)} queries, recall@{args.k} vs. exact float32\n")
+
+        truth = None
+        context = multiprocessing.get_context("spawn")
+        for quantization, rescore in SETTINGS:
+            with context.Pool(1) as pool:
+                results, latencies, mapped_mb, read_mb = pool.apply(
+                    _run, (path, quantization, rescore, queries, args.k)
+                )
+            if truth is None:
+                truth = [set(r.tolist()) for r in results]
+            recall = np.mean([len(t.intersection(r.tolist())) / args.k for t, r in zip(truth, results)])
+            print(f"{quantization:<8} rescore {rescore:>5}:  recall {recall:.3f}  "
+                  f"p50 {np.percentile(latencies, 50):6.2f} ms  p95 {np.percentile(latencies, 95):6.2f} ms  "
+                  f"read per query {read_mb:6.1f} MB  mapped after all queries {mapped_mb:6.1f} MB")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+"""Microbenchmark: selective edition-field extraction vs. the original full json.loads path.
+
+Usage: python scripts/bench_openlibrary_extract.py <ol_dump_editions.txt> [max_lines]
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "Strategist"))
+
+import ingest  # noqa: E402
+from ingest import extract_edition_fields, orjson  # noqa: E402
+
+
+def _baseline(raw):
+    book = json.loads(raw)
+    isbn13_list = book.get('isbn_13', [])
+    if not isbn13_list: return None
+    pubs = book.get('publishers', [])
+    if not pubs: return None
+    return (
+        str(isbn13_list[0]).strip(), pubs[0], book.get('title', 'Unknown'), book.get('subjects', []),
+        book.get('works', []), book.get('authors', []),
+    )
+
+
+def _orjson_full(raw):
+    book = orjson.loads(raw)
+    isbn13_list = book.get('isbn_13', [])
+    if not isbn13_list: return None
+    pubs = book.get('publishers', [])
+    if not pubs: return None
+    return (
+        str(isbn13_list[0]).strip(), pubs[0], book.get('title', 'Unknown'), book.get('subjects', []),
+        book.get('works', []), book.get('authors', []),
+    )
+
+
+def _without_orjson(raw):
+    """extract_edition_fields as it runs when orjson is not installed."""
+    saved, ingest.orjson = ingest.orjson, None
+    try:
+        return extract_edition_fields(raw)
+    finally:
+        ingest.orjson = saved
+
+
+def _time(func, blobs):
+    start = time.perf_counter()
+    results = [func(raw) for raw in blobs]
+    return time.perf_counter() - start, results
+
+
+def main() -> int:
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return 1
+    path = sys.argv[1]
+    max_lines = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+
+    blobs = []
+    with open(path, "rb") as f:
+        for line in f:
+            cols = line.strip().split(b"\t")
+            if len(cols) >= 5:
+                blobs.append(cols[4])
+            if len(blobs) >= max_lines:
+                break
+    total_mb = sum(len(b) for b in blobs) / 1e6
+    print(f"Loaded {len(blobs):,} edition records ({total_mb:.1f} MB)")
+
+    candidates = [("json.loads (current)", _baseline)]
+    if orjson is not None:
+        candidates.append(("orjson.loads", _orjson_full))
+    candidates.append(("extract (no orjson)", _without_orjson))
+    candidates.append(("extract_edition_fields", extract_edition_fields))
+
+    base_elapsed, expected = None, None
+    for name, func in candidates:
+        elapsed, results = _time(func, blobs)
+        if expected is None:
+            base_elapsed, expected = elapsed, results
+        mismatches = sum(1 for a, b in zip(expected, results) if a != b)
+        print(
+            f"{name:<24} {elapsed:7.2f}s  {len(blobs) / elapsed:>11,.0f} rec/s  "
+            f"{total_mb / elapsed:7.1f} MB/s  speedup {base_elapsed / elapsed:4.1f}x  mismatches {mismatches}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+"""Converts BM25 JSON weights to the memory-mapped binary format (app/services/bm25.py).
+
+    python scripts/convert_bm25.py [weights.json ...]
+
+Without arguments, converts config.STRATEGIST_BM25_PATH and the weights of every index version in
+config.STRATEGIST_INDEX_ALIAS_PATH. Each `<name>.bin` is written next to its JSON file and is used by the
+app as long as the JSON is unchanged since the conversion. Every conversion is checked to round-trip losslessly.
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import config  # noqa: E402
+from app.services.bm25 import ArrayBM25Encoder, binary_path_for, convert_json_to_binary  # noqa: E402
+from pinecone_text.sparse import BM25Encoder  # noqa: E402
+
+
+def _default_paths():
+    paths = [ROOT_DIR / config.STRATEGIST_BM25_PATH]
+    alias_path = ROOT_DIR / config.STRATEGIST_INDEX_ALIAS_PATH
+    if alias_path.exists():
+        alias = json.loads(alias_path.read_text(encoding="utf-8"))
+        paths += [alias_path.parent / entry["bm25_path"] for entry in alias["versions"].values()]
+    return [p for p in paths if p.exists()]
+
+
+def main() -> int:
+    paths = [Path(p) for p in sys.argv[1:]] or _default_paths()
+    for json_path in paths:
+        bin_path = binary_path_for(json_path)
+        convert_json_to_binary(json_path, bin_path)
+
+        started = time.perf_counter()
+        BM25Encoder().load(str(json_path))
+        json_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        ArrayBM25Encoder.load_binary(bin_path, reuse=False)
+        bin_ms = (time.perf_counter() - started) * 1000
+
+        print(f"{json_path} -> {bin_path.name}: {json_path.stat().st_size / 1e3:,.0f} KB -> "
+              f"{bin_path.stat().st_size / 1e3:,.0f} KB, load {json_ms:.1f} ms -> {bin_ms:.1f} ms (lossless)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,183 @@
+"""Blue/green management of the Strategist's Pinecone index versions.
+
+    python scripts/strategist_index.py list
+    python scripts/strategist_index.py benchmark VERSION --queries queries.jsonl
+        Warms VERSION up and reports query latency and recall@k next to the active version.
+    python scripts/strategist_index.py cutover VERSION [--queries queries.jsonl] [--force]
+        Points the alias at VERSION. With --queries, refuses if latency or recall regress past the limits.
+    python scripts/strategist_index.py rollback
+        Points the alias back at the previous version.
+    python scripts/strategist_index.py drop VERSION
+        Deletes a retired version's namespace and files.
+
+The queries file is JSONL of {"semantic_query", "lexical_keywords", "expected_ids" (optional)}. Without
+expected_ids, recall@k is reported against the active version's top-k and does not gate a cutover.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from pinecone import Pinecone
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+sys.path.insert(0, str(ROOT_DIR / "Strategist"))
+
+import config  # noqa: E402
+import index_versions  # noqa: E402
+from app.agents.strategist import create_strategist_service, query_index  # noqa: E402
+
+
+def _alias_path() -> str:
+    return str(ROOT_DIR / config.STRATEGIST_INDEX_ALIAS_PATH)
+
+
+def _load_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _embed_queries(service, queries):
+    res = service.client.embeddings.create(
+        input=[q["semantic_query"] for q in queries], model=service.embed_model
+    )
+    return [d.embedding for d in res.data]
+
+
+def _run(service, queries, dense_vecs, top_k, warmup):
+    """Returns (latencies in ms, top-k id lists) for every query, after `warmup` unmeasured passes."""
+    for q, dense_vec in list(zip(queries, dense_vecs))[:warmup]:
+        query_index(service, dense_vec, service.bm25.encode_queries(" ".join(q["lexical_keywords"])), top_k)
+
+    latencies, results = [], []
+    for q, dense_vec in zip(queries, dense_vecs):
+        sparse_vec = service.bm25.encode_queries(" ".join(q["lexical_keywords"]))
+        started = time.perf_counter()
+        matches = query_index(service, dense_vec, sparse_vec, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([m.id for m in matches])
+    return latencies, results
+
+
+def _recall(results, expected):
+    scores = [len(set(got) & set(want)) / len(want) for got, want in zip(results, expected) if want]
+    return statistics.mean(scores) if scores else 1.0
+
+
+def _summary(latencies, recall):
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(ordered), 1),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 1),
+        "recall_at_k": None if recall is None else round(recall, 4),
+    }
+
+
+def _pct(value):
+    return "n/a" if value is None else f"{value:.2%}"
+
+
+def benchmark(version, queries_path, top_k, warmup):
+    """Benchmarks `version` and the active version on the same queries. Returns (candidate, active or None)."""
+    alias = index_versions.load_alias(_alias_path())
+    queries = _load_queries(queries_path)
+    candidate = create_strategist_service(version)
+    dense_vecs = _embed_queries(candidate, queries)
+
+    active = None
+    active_results = None
+    if alias["active"] and alias["active"] != version:
+        active_service = create_strategist_service(alias["active"])
+        active_latencies, active_results = _run(active_service, queries, dense_vecs, top_k, warmup)
+
+    latencies, results = _run(candidate, queries, dense_vecs, top_k, warmup)
+    ground_truth = all("expected_ids" in q for q in queries)
+    if ground_truth:
+        expected = [q["expected_ids"] for q in queries]
+    elif active_results is not None:
+        expected = active_results  # Agreement with what is serving now
+    else:
+        expected = None
+
+    if active_results is not None:
+        active = _summary(active_latencies, _recall(active_results, expected) if ground_truth else None)
+    stats = _summary(latencies, _recall(results, expected) if expected else None)
+
+    alias = index_versions.load_alias(_alias_path())
+    alias["versions"][version]["benchmark"] = dict(stats, queries=len(queries), top_k=top_k)
+    index_versions.save_alias(alias, _alias_path())
+
+    print(f"{version}: p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  recall@{top_k} {_pct(stats['recall_at_k'])}"
+          + ("" if ground_truth else "  (recall vs. the active version's results)"))
+    if active:
+        print(f"{alias['active']} (active): p50 {active['p50_ms']} ms  p95 {active['p95_ms']} ms  "
+              f"recall@{top_k} {_pct(active['recall_at_k'])}")
+    return stats, active
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["list", "benchmark", "cutover", "rollback", "drop"])
+    parser.add_argument("version", nargs="?")
+    parser.add_argument("--queries")
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--max-latency-regression", type=float, default=0.25, help="Allowed p95 increase (fraction)")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02, help="Allowed recall@k drop (absolute)")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    os.chdir(ROOT_DIR)  # config paths are relative to the repo root
+    alias = index_versions.load_alias(_alias_path())
+
+    if args.command == "list":
+        for name, entry in alias["versions"].items():
+            marker = "*" if name == alias["active"] else " "
+            print(f"{marker} {name}  {entry['status']:<9} {entry['created_at']}  {entry.get('benchmark', '')}")
+        return 0
+
+    if args.command == "rollback":
+        print(f"Active version: {index_versions.rollback(alias, _alias_path())}")
+        return 0
+
+    if not args.version:
+        parser.error(f"{args.command} needs a VERSION")
+
+    if args.command == "drop":
+        # The namespace is in Pinecone even when queries are served from the local exports
+        if not config.PINECONE_API_KEY:
+            parser.error("drop needs PINECONE_API_KEY to delete the version's namespace")
+        index = Pinecone(api_key=config.PINECONE_API_KEY).Index(config.PINECONE_INDEX)
+        index_versions.drop_version(index, alias, args.version, _alias_path())
+        print(f"Dropped {args.version}")
+        return 0
+
+    if args.command == "benchmark":
+        if not args.queries:
+            parser.error("benchmark needs --queries")
+        benchmark(args.version, args.queries, args.top_k, args.warmup)
+        return 0
+
+    if args.queries and not args.force:
+        stats, active = benchmark(args.version, args.queries, args.top_k, args.warmup)
+        if active:
+            if stats["p95_ms"] > active["p95_ms"] * (1 + args.max_latency_regression):
+                print("Refusing cutover: p95 latency regressed (use --force to override)")
+                return 1
+            # Only gated with ground truth; agreement with the active version is informational
+            if active["recall_at_k"] is not None and stats["recall_at_k"] < active["recall_at_k"] - args.max_recall_drop:
+                print("Refusing cutover: recall regressed (use --force to override)")
+                return 1
+
+    alias = index_versions.load_alias(_alias_path())
+    index_versions.cutover(alias, args.version, _alias_path())
+    print(f"Active version: {args.version} (rollback target: {alias['previous']})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())